@@ -61,8 +61,6 @@ MIDDLEWARE = [
     'Role_Based_auth_app.middleware.APIAnalyticsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "corsheaders.middleware.CorsMiddleware",
-    "django.middleware.common.CommonMiddleware",
 ]
 
 ROOT_URLCONF = 'Role_Based_auth.urls'
@@ -89,9 +87,25 @@ ASGI_APPLICATION = 'Role_Based_auth.asgi.application'
 if config('DATABASE_URL', default=None):
     # Production database (PostgreSQL)
     import dj_database_url
+    DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
     DATABASES = {
-        'default': dj_database_url.parse(config('DATABASE_URL'))
+        # Keep connections open between requests instead of reconnecting every time,
+        # checking that a reused connection is still alive before the request uses it
+        'default': dj_database_url.parse(
+            config('DATABASE_URL'),
+            conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
+            conn_health_checks=True,
+            # Server-side cursors (QuerySet.iterator()) break under PgBouncer transaction pooling
+            disable_server_side_cursors=DB_PGBOUNCER,
+        )
     }
+    # PgBouncer rejects the "options" startup parameter (and would leak the
+    # session setting to other clients), so behind it set statement_timeout
+    # on the database role instead: ALTER ROLE <user> SET statement_timeout = 30000
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' and not DB_PGBOUNCER:
+        DATABASES['default'].setdefault('OPTIONS', {})['options'] = (
+            f"-c statement_timeout={config('DB_STATEMENT_TIMEOUT', default=30000, cast=int)}"
+        )
 else:
     # Development database (SQLite)
     DATABASES = {
@@ -104,12 +118,26 @@ else:
 # Redis Configuration
 REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379')
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+# Cached API responses are invalidated on save, which only works when every
+# worker shares the cache; the per-process LocMemCache is for local runs, where
+# caching.response_cache_enabled() turns the response cache off
+if config('USE_REDIS_CACHE', default=not DEBUG, cast=bool):
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": f"{REDIS_URL}/1",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "unique-snowflake",
+        }
     }
-}
 
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
@@ -130,6 +158,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'Role_Based_auth_app.tasks.calculate_monthly_usage',
         'schedule': 3600.0,  # Every hour
     },
+    'flush-product-views': {
+        'task': 'Role_Based_auth_app.tasks.flush_product_views',
+        'schedule': 30.0,
+    },
 }
 
 # Channels Configuration
@@ -145,7 +177,7 @@ CHANNEL_LAYERS = {
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Role_Based_auth_app.authentication.OrganizationJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -187,6 +219,8 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
+    # Adds the username/role/org claims on every token endpoint; MeView reads org
+    'TOKEN_OBTAIN_SERIALIZER': 'Role_Based_auth_app.serializers.MyTokenObtainPairSerializer',
 }
 
 # DRF Spectacular (API Documentation)
@@ -214,6 +248,11 @@ else:
     # Local file storage
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
+    # Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to a temp file in
+    # chunks; keeping it on MEDIA_ROOT's filesystem lets the storage rename it
+    # into place instead of copying the whole file a second time. The app's
+    # AppConfig.ready() creates it, keeping settings free of side effects
+    FILE_UPLOAD_TEMP_DIR = config('FILE_UPLOAD_TEMP_DIR', default=str(MEDIA_ROOT / '.upload_tmp'))
 
 # Static files configuration
 STATIC_URL = '/static/'
@@ -1,7 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework import routers
 from rest_framework_simplejwt.views import (
     TokenObtainPairView, TokenRefreshView, TokenVerifyView
@@ -10,7 +9,7 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from Role_Based_auth_app import views as app_views
 
 # API Router for ViewSets
-router = routers.DefaultRouter()
+router = routers.SimpleRouter()
 router.register(r'organizations', app_views.OrganizationViewSet, basename='organization')
 router.register(r'users', app_views.UserViewSet, basename='user')
 router.register(r'categories', app_views.CategoryViewSet, basename='category')
@@ -48,7 +47,7 @@ urlpatterns = [
     path('api/v1/', include('Role_Based_auth_app.urls')),
 ]
 
-# Serve media files in development
-if settings.DEBUG:
+# Serve local media files in development; static files are served by WhiteNoise
+if settings.DEBUG and settings.MEDIA_ROOT:
+    from django.conf.urls.static import static
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
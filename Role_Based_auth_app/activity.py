@@ -0,0 +1,129 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import DatabaseError, close_old_connections, transaction
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_QUEUE_SIZE = 10000
+ACTIVITY_BATCH_SIZE = 500
+ACTIVITY_FLUSH_INTERVAL = 1.0  # seconds
+ACTIVITY_EXIT_TIMEOUT = 5.0  # seconds
+
+_activity_queue = queue.Queue(maxsize=ACTIVITY_QUEUE_SIZE)
+_writer_lock = threading.Lock()
+_writer_thread = None
+# Queued by _drain_on_exit: the writer flushes the batch it holds and returns
+_STOP = object()
+
+
+def log_activity(**fields):
+    """
+    Queue an ActivityLog row for the background writer once the current
+    transaction commits, so rolled-back changes are never logged and the rows
+    the entry points at are visible to the writer's connection. Outside a
+    transaction the row is queued immediately; it is dropped when the queue is full.
+    """
+    transaction.on_commit(lambda: _enqueue(fields))
+
+
+def _enqueue(fields):
+    ensure_activity_writer()
+    try:
+        _activity_queue.put_nowait(fields)
+    except queue.Full:
+        logger.warning("Activity log queue full, dropping entry")
+
+
+def ensure_activity_writer():
+    """Start the writer thread for this process if it is not running (e.g. after a fork)."""
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(
+                target=_run_writer, name='activity-log-writer', daemon=True
+            )
+            _writer_thread.start()
+
+
+def flush_activity(batch):
+    """Insert a batch of queued rows with a single multi-row INSERT"""
+    # ActivityLog.organization is required; rows without one can never be stored
+    rows = [row for row in (ActivityLog(**fields) for fields in batch) if row.organization_id]
+    if not rows:
+        return
+    try:
+        ActivityLog.objects.bulk_create(rows, batch_size=ACTIVITY_BATCH_SIZE, ignore_conflicts=True)
+    except DatabaseError:
+        # The failed insert rolled back the whole batch; retry row by row so
+        # one bad entry (e.g. its organization was deleted meanwhile) costs only itself
+        logger.warning("Batch insert of %d activity log entries failed, retrying one by one", len(rows))
+        for row in rows:
+            try:
+                ActivityLog.objects.bulk_create([row], ignore_conflicts=True)
+            except DatabaseError:
+                logger.exception("Failed to write activity log entry: %s", row.description)
+
+
+def _next_batch():
+    """Block for the first row, then collect more until the batch fills, the interval elapses or _STOP arrives."""
+    batch = [_activity_queue.get(timeout=ACTIVITY_FLUSH_INTERVAL)]
+    deadline = time.monotonic() + ACTIVITY_FLUSH_INTERVAL
+    while batch[-1] is not _STOP and len(batch) < ACTIVITY_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_activity_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run_writer():
+    while True:
+        try:
+            batch = _next_batch()
+        except queue.Empty:
+            continue
+        stop = batch[-1] is _STOP
+        if stop:
+            batch.pop()
+        close_old_connections()
+        flush_activity(batch)
+        if stop:
+            return
+
+
+@atexit.register
+def _drain_on_exit():
+    """
+    Stop the writer and wait for it to flush the batch it is holding, then
+    write whatever is still queued. Without the join, rows the daemon thread
+    had already taken off the queue would die with it.
+    """
+    writer = _writer_thread
+    if writer is not None and writer.is_alive():
+        try:
+            _activity_queue.put(_STOP, timeout=ACTIVITY_EXIT_TIMEOUT)
+        except queue.Full:
+            pass
+        else:
+            writer.join(ACTIVITY_EXIT_TIMEOUT)
+    batch = []
+    while True:
+        try:
+            row = _activity_queue.get_nowait()
+        except queue.Empty:
+            break
+        if row is not _STOP:
+            batch.append(row)
+    if batch:
+        flush_activity(batch)
@@ -1,8 +1,53 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (Organization, User, Category, Product, ProductImage, 
                      Subscription, Usage, FileUpload, APIKey, Notification, ActivityLog)
 
+# Columns read when rendering a related user through User.__str__
+USER_STR_FIELDS = ("username", "role", "organization__name")
+
+
+class OnlyFieldsChangeList(ChangeList):
+    """Changelist that loads only the columns named in the admin's list_only_fields for the rendered page"""
+    
+    def get_results(self, request):
+        # Narrow only the page being rendered: actions such as delete_selected
+        # get cl.get_queryset(), whose rows would otherwise each fetch their
+        # deferred columns
+        self.queryset = self.queryset.only(*self.model_admin.list_only_fields)
+        super().get_results(request)
+
+
+class ListOnlyFieldsMixin:
+    """
+    Restrict the changelist page query to list_only_fields. Actions and the
+    change and delete views keep using the full queryset from get_queryset().
+    """
+    list_only_fields = ()
+    
+    def get_changelist(self, request, **kwargs):
+        return OnlyFieldsChangeList
+
+
+class OrgRelatedAdminMixin:
+    """
+    Build the admin queryset from objects_with_org, so rendering objects whose
+    __str__ reads organization.name (autocomplete results, change and delete
+    pages) does not query once per row.
+    """
+    
+    def get_queryset(self, request):
+        queryset = self.model.objects_with_org.get_queryset()
+        # ChangeList only applies list_select_related to querysets without
+        # select_related, so it has to be merged in here
+        if isinstance(self.list_select_related, (list, tuple)):
+            queryset = queryset.select_related(*self.list_select_related)
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
@@ -15,8 +60,10 @@ class OrganizationAdmin(admin.ModelAdmin):
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ("username", "email", "role", "organization", "is_active", "last_login")
+    list_select_related = ("organization",)
     list_filter = ("role", "is_active", "organization", "is_email_verified")
     search_fields = ("username", "email", "first_name", "last_name")
+    autocomplete_fields = ("organization",)
     readonly_fields = ("id", "created_at", "updated_at", "last_login", "date_joined")
     
     fieldsets = BaseUserAdmin.fieldsets + (
@@ -31,9 +78,11 @@ class UserAdmin(BaseUserAdmin):
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "slug", "organization", "is_active", "sort_order")
+    list_select_related = ("organization",)
     list_filter = ("is_active", "organization")
     search_fields = ("name", "slug")
     readonly_fields = ("id", "created_at", "updated_at")
+    autocomplete_fields = ("organization",)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -45,8 +94,10 @@ class ProductImageInline(admin.TabularInline):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ("product_name", "organization", "category", "price", "quantity", "is_active")
+    list_select_related = ("organization", "category__organization")
     list_filter = ("is_active", "is_featured", "is_digital", "organization", "category")
     search_fields = ("product_name", "name", "sku", "description")
+    autocomplete_fields = ("organization", "category", "created_by", "updated_by")
     readonly_fields = ("id", "sku", "view_count", "rating", "review_count", "created_at", "updated_at")
     inlines = [ProductImageInline]
     
@@ -78,56 +129,93 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ("product", "alt_text", "is_primary", "sort_order")
+    list_select_related = ("product",)
     list_filter = ("is_primary", "product__organization")
     search_fields = ("product__product_name", "alt_text")
+    autocomplete_fields = ("product",)
     readonly_fields = ("id", "created_at")
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(OrgRelatedAdminMixin, admin.ModelAdmin):
     list_display = ("organization", "plan", "status", "current_period_end", "is_active")
+    list_select_related = ("organization",)
     list_filter = ("plan", "status", "cancel_at_period_end")
     search_fields = ("organization__name", "stripe_customer_id")
+    autocomplete_fields = ("organization",)
     readonly_fields = ("id", "created_at", "updated_at")
 
 
 @admin.register(Usage)
 class UsageAdmin(admin.ModelAdmin):
     list_display = ("organization", "feature", "count", "limit", "usage_percentage")
+    list_select_related = ("organization",)
     list_filter = ("feature", "organization")
     search_fields = ("organization__name", "feature")
+    autocomplete_fields = ("organization",)
     readonly_fields = ("id", "usage_percentage", "is_limit_exceeded", "created_at", "updated_at")
 
 
 @admin.register(FileUpload)
-class FileUploadAdmin(admin.ModelAdmin):
+class FileUploadAdmin(ListOnlyFieldsMixin, admin.ModelAdmin):
     list_display = ("original_name", "organization", "uploaded_by", "file_type", "file_size_formatted")
+    list_select_related = ("organization", "uploaded_by__organization")
+    list_only_fields = (
+        "id", "original_name", "file_type", "file_size", "organization__name",
+        *(f"uploaded_by__{field}" for field in USER_STR_FIELDS),
+    )
     list_filter = ("file_type", "is_public", "organization")
+    show_full_result_count = False
     search_fields = ("original_name", "organization__name", "uploaded_by__username")
+    autocomplete_fields = ("organization", "uploaded_by")
     readonly_fields = ("id", "file_size", "file_size_formatted", "download_count", "created_at", "updated_at")
 
 
 @admin.register(APIKey)
-class APIKeyAdmin(admin.ModelAdmin):
+class APIKeyAdmin(OrgRelatedAdminMixin, admin.ModelAdmin):
     list_display = ("name", "organization", "created_by", "is_active", "last_used", "is_expired")
+    list_select_related = ("organization", "created_by__organization")
     list_filter = ("is_active", "organization")
     search_fields = ("name", "organization__name", "created_by__username")
-    readonly_fields = ("id", "key", "key_preview", "usage_count", "is_expired", "created_at", "updated_at")
+    autocomplete_fields = ("organization", "created_by")
+    readonly_fields = ("id", "key_preview", "usage_count", "is_expired", "created_at", "updated_at")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            # Only the hash is stored, so this is the one chance to copy the key
+            messages.warning(request, f"API key for {obj.name}: {obj.raw_key}")
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(ListOnlyFieldsMixin, admin.ModelAdmin):
     list_display = ("title", "user", "organization", "notification_type", "is_read", "created_at")
+    list_select_related = ("user__organization", "organization")
+    list_only_fields = (
+        "id", "title", "notification_type", "is_read", "created_at", "organization__name",
+        *(f"user__{field}" for field in USER_STR_FIELDS),
+    )
     list_filter = ("notification_type", "is_read", "organization")
+    show_full_result_count = False
     search_fields = ("title", "message", "user__username")
+    autocomplete_fields = ("user", "organization")
     readonly_fields = ("id", "created_at", "read_at")
 
 
 @admin.register(ActivityLog)
-class ActivityLogAdmin(admin.ModelAdmin):
+class ActivityLogAdmin(ListOnlyFieldsMixin, admin.ModelAdmin):
     list_display = ("action", "resource_type", "user", "organization", "created_at")
+    list_select_related = ("user__organization", "organization")
+    list_only_fields = (
+        "id", "action", "resource_type", "created_at", "organization__name",
+        *(f"user__{field}" for field in USER_STR_FIELDS),
+    )
+    # resource_type lists its choices and organization lists Organization
+    # rows, so neither scans the log for distinct values
     list_filter = ("action", "resource_type", "organization")
+    show_full_result_count = False
     search_fields = ("description", "user__username", "resource_type")
+    autocomplete_fields = ("user", "organization")
     readonly_fields = ("id", "created_at")
     
     def has_add_permission(self, request):
@@ -1,9 +1,29 @@
+import logging
+import os
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class RoleBasedAuthAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Role_Based_auth_app'
     
     def ready(self):
-        import Role_Based_auth_app.signals  # noqa
+        from Role_Based_auth_app.signals import connect_signals
+        connect_signals()
+        # The activity log writer thread is started by the first log_activity()
+        # that commits, so management commands and pre-fork masters don't run one
+        self.ensure_upload_temp_dir()
+    
+    def ensure_upload_temp_dir(self):
+        """Create FILE_UPLOAD_TEMP_DIR if configured; a read-only MEDIA_ROOT only costs a warning"""
+        from django.conf import settings
+        temp_dir = getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None)
+        if not temp_dir:
+            return
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not create FILE_UPLOAD_TEMP_DIR {temp_dir}: {e}")
@@ -0,0 +1,34 @@
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+ORGANIZATION_CACHE_TIMEOUT = 60  # seconds
+
+
+def response_cache_enabled():
+    """
+    Whether API responses may be cached. Invalidation only reaches the cache
+    of the process that saved the change, so a per-process LocMemCache would
+    leave every other worker serving the old response until it expires.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def _version_key(organization_id):
+    return f'organization:{organization_id}:version'
+
+
+def organization_cache_key(organization_id, suffix):
+    """Cache key for a response about an organization; changes whenever the organization is saved"""
+    version = cache.get(_version_key(organization_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(_version_key(organization_id), version, None)
+        version = cache.get(_version_key(organization_id), version)
+    return f'organization:{organization_id}:{version}:{suffix}'
+
+
+def invalidate_organization_cache(organization_id):
+    """Orphan every cached response for the organization; they expire with their own timeout"""
+    cache.delete(_version_key(organization_id))
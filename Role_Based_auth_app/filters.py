@@ -1,3 +1,4 @@
+from django.db.models import Q
 from django_filters import rest_framework as filters
 from .models import Product, FileUpload, Notification
 
@@ -14,20 +15,18 @@ class ProductFilter(filters.FilterSet):
 		fields = ['is_active', 'is_featured', 'is_digital']
 
 	def search(self, queryset, name, value):
-		return queryset.filter(product_name__icontains=value) | queryset.filter(description__icontains=value)
+		return queryset.filter(Q(product_name__icontains=value) | Q(description__icontains=value))
 
 
 
 class FileUploadFilter(filters.FilterSet):
-	q = filters.CharFilter(method='search')
+	# Substring match served by the fileupload_original_name_trgm index (migration 0005)
+	q = filters.CharFilter(field_name='original_name', lookup_expr='icontains')
 
 	class Meta:
 		model = FileUpload
 		fields = ['is_public', 'file_type']
 
-	def search(self, queryset, name, value):
-		return queryset.filter(original_name__icontains=value)
-
 
 
 class NotificationFilter(filters.FilterSet):
@@ -15,10 +15,16 @@ class Command(BaseCommand):
 		owner.set_password('owner1234')
 		owner.save()
 		cat, _ = Category.objects.get_or_create(organization=org, name='General', slug='general')
-		for i in range(1, 6):
-			Product.objects.get_or_create(
-				product_name=f"Demo Product {i}",
-				organization=org,
-				defaults={'price': 100 + i, 'quantity': 10 * i}
-			)
+		names = [f"Demo Product {i}" for i in range(1, 6)]
+		existing = set(
+			Product.objects.filter(organization=org, product_name__in=names).values_list('product_name', flat=True)
+		)
+		# bulk_create bypasses Product.save(), so fill in the fields it would derive
+		Product.objects.bulk_create(
+			[
+				Product(product_name=name, name=name, sku=Product.generate_sku(), organization=org, price=100 + i, quantity=10 * i)
+				for i, name in enumerate(names, 1) if name not in existing
+			],
+			ignore_conflicts=True,
+		)
 		self.stdout.write(self.style.SUCCESS('Seeded demo data.'))
\ No newline at end of file
@@ -1,30 +1,47 @@
 
 from django.utils.deprecation import MiddlewareMixin
 
+from Role_Based_auth_app.activity import log_activity
+from Role_Based_auth_app.models import ActivityLog
+
+_MUTATING = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+_SENSITIVE_PREFIXES = ("/api/auth/",)
+_METHOD_TO_ACTION = {
+	'POST': 'create',
+	'PUT': 'update',
+	'PATCH': 'update',
+	'DELETE': 'delete',
+}
 
 
 class APIAnalyticsMiddleware(MiddlewareMixin):
 	"""Simple request analytics + ActivityLog capture for mutating requests."""
-	import re
-	SENSITIVE_PATHS = re.compile(r"/api/auth/|/admin/")
 
 	def process_response(self, request, response):
+		# Reads, static/media files and auth endpoints are never logged
+		if (request.method not in _MUTATING or not request.path.startswith("/api/")
+				or request.path.startswith(_SENSITIVE_PREFIXES)):
+			return response
 		try:
-			if request.method in ("POST", "PUT", "PATCH", "DELETE") and not self.SENSITIVE_PATHS.search(request.path):
-				from Role_Based_auth_app.models import ActivityLog
-				ActivityLog.objects.create(
-					organization=getattr(request, 'organization', None),
-					user=getattr(request, 'user', None) if getattr(request, 'user', None) and request.user.is_authenticated else None,
-					action=self._method_to_action(request.method),
-					resource_type='API',
-					resource_id=None,
-					description=f"{request.method} {request.path}",
-					ip_address=self._get_ip(request),
-					user_agent=request.META.get('HTTP_USER_AGENT', ''),
-					request_path=request.path,
-					request_method=request.method,
-					metadata={"status_code": response.status_code},
-				)
+			# DRF copies the authenticated user back onto the HttpRequest, and the
+			# user row already carries organization_id, so no lookup is needed here
+			user = getattr(request, 'user', None)
+			if user is None or not user.is_authenticated:
+				user = None
+			# Queued for the background writer so the INSERT stays off the request path
+			log_activity(
+				organization_id=getattr(user, 'organization_id', None),
+				user_id=getattr(user, 'pk', None),
+				action=_METHOD_TO_ACTION.get(request.method, 'view'),
+				resource_type=ActivityLog.RESOURCE_API,
+				resource_id=None,
+				description=f"{request.method} {request.path}",
+				ip_address=self._get_ip(request),
+				user_agent=request.META.get('HTTP_USER_AGENT', ''),
+				request_path=request.path,
+				request_method=request.method,
+				metadata={"status_code": response.status_code},
+			)
 		except Exception:
 			# Fail-safe: never block request due to analytics error
 			pass
@@ -32,22 +49,11 @@ class APIAnalyticsMiddleware(MiddlewareMixin):
 
 
 
-	@staticmethod
-	def _method_to_action(method: str) -> str:
-		return {
-			'POST': 'create',
-			'PUT': 'update',
-			'PATCH': 'update',
-			'DELETE': 'delete',
-		}.get(method, 'view')
-
 	@staticmethod
 	def _get_ip(request):
 		x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
 		if x_forwarded_for:
-			ip = x_forwarded_for.split(',')[0]
-		else:
-			ip = request.META.get('REMOTE_ADDR')
-		return ip
+			return x_forwarded_for.partition(',')[0].strip()
+		return request.META.get('REMOTE_ADDR')
 
 
@@ -0,0 +1,482 @@
+# Generated by Django 5.2.5 on 2025-08-31 10:13
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Stands in for 0004 on databases that have not applied it. 0004's one-off
+    default for User.created_at is the integer 1, which cannot be converted to
+    a datetime, so migrating a fresh database fails there; this copy uses
+    timezone.now. Databases that already applied 0004 record this as applied.
+    """
+
+    replaces = [
+        ('Role_Based_auth_app', '0004_category_organization_productimage_subscription_and_more'),
+    ]
+
+    dependencies = [
+        ('Role_Based_auth_app', '0003_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='category_images/')),
+                ('is_active', models.BooleanField(default=True)),
+                ('sort_order', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Categories',
+                'ordering': ['sort_order', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('domain', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('logo', models.ImageField(blank=True, null=True, upload_to='org_logos/')),
+                ('description', models.TextField(blank=True)),
+                ('plan', models.CharField(default='basic', max_length=50)),
+                ('is_active', models.BooleanField(default=True)),
+                ('trial_end_date', models.DateTimeField(blank=True, null=True)),
+                ('settings', models.JSONField(default=dict)),
+                ('timezone', models.CharField(default='UTC', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductImage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('image', models.ImageField(upload_to='product_images/')),
+                ('alt_text', models.CharField(blank=True, max_length=255)),
+                ('is_primary', models.BooleanField(default=False)),
+                ('sort_order', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['sort_order', 'created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('plan', models.CharField(max_length=50)),
+                ('status', models.CharField(default='active', max_length=50)),
+                ('stripe_customer_id', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('stripe_subscription_id', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('current_period_start', models.DateTimeField()),
+                ('current_period_end', models.DateTimeField()),
+                ('cancel_at_period_end', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Usage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('feature', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('limit', models.PositiveIntegerField(blank=True, null=True)),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='product',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='cost_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='created_products', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_digital',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_featured',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='meta_description',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='meta_title',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=3, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(5.0)]),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sale_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='short_description',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=100, unique=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='tags',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='updated_products', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to='avatars/'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='bio',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='email_verification_token',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='is_email_verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='language',
+            field=models.CharField(default='en', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_login_ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='login_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='notifications_enabled',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='password_reset_token',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='two_factor_enabled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='product_name',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='quantity',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='role',
+            field=models.CharField(choices=[('owner', 'Owner'), ('admin', 'Admin'), ('manager', 'Manager'), ('user', 'User'), ('viewer', 'Viewer')], default='user', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='Role_Based_auth_app.category'),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('info', 'Info'), ('success', 'Success'), ('warning', 'Warning'), ('error', 'Error')], default='info', max_length=20)),
+                ('is_read', models.BooleanField(default=False)),
+                ('is_sent', models.BooleanField(default=False)),
+                ('action_url', models.URLField(blank=True)),
+                ('action_text', models.CharField(blank=True, max_length=100)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='Role_Based_auth_app.organization')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FileUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='uploads/')),
+                ('original_name', models.CharField(max_length=255)),
+                ('file_type', models.CharField(max_length=50)),
+                ('file_size', models.PositiveIntegerField()),
+                ('mime_type', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('tags', models.JSONField(blank=True, default=list)),
+                ('is_public', models.BooleanField(default=False)),
+                ('access_key', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('download_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_files', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='Role_Based_auth_app.organization')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='categories', to='Role_Based_auth_app.organization'),
+        ),
+        migrations.CreateModel(
+            name='APIKey',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('key_preview', models.CharField(max_length=20)),
+                ('permissions', models.JSONField(default=list)),
+                ('rate_limit', models.PositiveIntegerField(default=1000)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_used', models.DateTimeField(blank=True, null=True)),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='created_api_keys', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_keys', to='Role_Based_auth_app.organization')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('login', 'Login'), ('logout', 'Logout'), ('view', 'View'), ('export', 'Export'), ('import', 'Import')], max_length=20)),
+                ('resource_type', models.CharField(max_length=100)),
+                ('resource_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('description', models.TextField()),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.TextField(blank=True)),
+                ('request_path', models.CharField(blank=True, max_length=500)),
+                ('request_method', models.CharField(blank=True, max_length=10)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activity_logs', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_logs', to='Role_Based_auth_app.organization')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='organization',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='Role_Based_auth_app.organization'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='organization',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='users', to='Role_Based_auth_app.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['organization', 'is_active'], name='Role_Based__organiz_1c3c57_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['organization', 'category'], name='Role_Based__organiz_1de9bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sku'], name='Role_Based__sku_b55759_idx'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='Role_Based_auth_app.product'),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='organization',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='subscription', to='Role_Based_auth_app.organization'),
+        ),
+        migrations.AddField(
+            model_name='usage',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_records', to='Role_Based_auth_app.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read'], name='Role_Based__user_id_1626e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['organization', 'created_at'], name='Role_Based__organiz_476bbb_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='category',
+            unique_together={('organization', 'slug')},
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['organization', 'created_at'], name='Role_Based__organiz_0edd86_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'action'], name='Role_Based__user_id_bb33e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['resource_type', 'resource_id'], name='Role_Based__resourc_60dfbb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usage',
+            index=models.Index(fields=['organization', 'feature'], name='Role_Based__organiz_701875_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usage',
+            index=models.Index(fields=['period_start', 'period_end'], name='Role_Based__period__2744b8_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usage',
+            unique_together={('organization', 'feature', 'period_start')},
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:09
+
+from django.db import migrations
+
+# (index name, model, column) backing the icontains searches in filters.py.
+# Django compiles icontains on PostgreSQL to UPPER("col"::text) LIKE UPPER(...),
+# so the trigram indexes are built on that same expression.
+TRIGRAM_INDEXES = (
+    ('product_name_trgm', 'product', 'product_name'),
+    ('product_description_trgm', 'product', 'description'),
+    ('fileupload_original_name_trgm', 'fileupload', 'original_name'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index_name, model_name, column in TRIGRAM_INDEXES:
+        table = apps.get_model('Role_Based_auth_app', model_name)._meta.db_table
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s ON %s USING gin ((UPPER(%s::text)) gin_trgm_ops)' % (
+                schema_editor.quote_name(index_name),
+                schema_editor.quote_name(table),
+                schema_editor.quote_name(column),
+            )
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % schema_editor.quote_name(index_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0004_category_organization_productimage_subscription_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
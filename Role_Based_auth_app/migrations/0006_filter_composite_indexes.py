@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0005_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='Role_Based__user_id_1626e6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='Role_Based__organiz_1c3c57_idx',
+        ),
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['organization', 'is_public', 'file_type'], name='file_org_public_type'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'notification_type', '-created_at'], name='notif_user_read_type_created'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['organization', 'is_active', 'is_featured'], name='prod_org_active_feat'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0006_filter_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apikey',
+            index=models.Index(fields=['organization', 'is_active', 'expires_at'], name='apikey_org_active_expiry'),
+        ),
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['organization', 'uploaded_by'], name='file_org_uploader'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['organization', 'role'], name='user_org_role'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0007_tenant_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='apikey',
+            name='apikey_org_active_expiry',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_user_read_created',
+        ),
+        migrations.AddIndex(
+            model_name='apikey',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['organization', 'expires_at'], name='apikey_org_active_expiry'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user', '-created_at'], name='notif_user_unread'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['organization', 'category'], name='prod_org_cat_active'),
+        ),
+    ]
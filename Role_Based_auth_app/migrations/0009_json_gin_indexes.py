@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:17
+
+from django.db import migrations
+
+# (index name, model, column) for JSON containment lookups (tags__contains=[...]).
+# JSONField is stored as jsonb on PostgreSQL; jsonb_path_ops only supports @>
+# but is smaller and faster than the default jsonb_ops for that operator.
+JSON_GIN_INDEXES = (
+    ('product_tags_gin', 'product', 'tags'),
+    ('fileupload_tags_gin', 'fileupload', 'tags'),
+    ('activitylog_metadata_gin', 'activitylog', 'metadata'),
+    ('usage_metadata_gin', 'usage', 'metadata'),
+)
+
+
+def create_json_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, model_name, column in JSON_GIN_INDEXES:
+        table = apps.get_model('Role_Based_auth_app', model_name)._meta.db_table
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s ON %s USING gin (%s jsonb_path_ops)' % (
+                schema_editor.quote_name(index_name),
+                schema_editor.quote_name(table),
+                schema_editor.quote_name(column),
+            )
+        )
+
+
+def drop_json_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, _, _ in JSON_GIN_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % schema_editor.quote_name(index_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0008_partial_active_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_json_gin_indexes, drop_json_gin_indexes),
+    ]
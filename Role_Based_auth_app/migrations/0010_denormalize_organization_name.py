@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:22
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_organization_name(apps, schema_editor):
+    Organization = apps.get_model('Role_Based_auth_app', 'Organization')
+    name = Subquery(Organization.objects.filter(pk=OuterRef('organization_id')).values('name')[:1])
+    for model_name in ('Category', 'FileUpload'):
+        apps.get_model('Role_Based_auth_app', model_name).objects.update(organization_name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0009_json_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='organization_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='organization_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_organization_name, migrations.RunPython.noop),
+    ]
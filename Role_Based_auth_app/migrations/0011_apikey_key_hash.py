@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:31
+
+import base64
+import hashlib
+import secrets
+
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+    APIKey = apps.get_model('Role_Based_auth_app', 'APIKey')
+    for api_key in APIKey.objects.only('pk', 'key').iterator():
+        digest = hashlib.blake2b(api_key.key.encode('ascii'), digest_size=32).digest()
+        APIKey.objects.filter(pk=api_key.pk).update(key_hash=digest)
+
+
+def reissue_keys(apps, schema_editor):
+    # The original keys cannot be recovered from their digests
+    APIKey = apps.get_model('Role_Based_auth_app', 'APIKey')
+    for pk in APIKey.objects.values_list('pk', flat=True).iterator():
+        key = 'sk_' + base64.urlsafe_b64encode(secrets.token_bytes(32))[:43].decode('ascii')
+        APIKey.objects.filter(pk=pk).update(key=key, key_preview=key[:8] + '...')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0010_denormalize_organization_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='key_hash',
+            field=models.BinaryField(editable=False, max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='apikey',
+            name='key',
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(hash_existing_keys, reissue_keys),
+        migrations.RemoveField(
+            model_name='apikey',
+            name='key',
+        ),
+        migrations.AlterField(
+            model_name='apikey',
+            name='key_hash',
+            field=models.BinaryField(editable=False, max_length=32, unique=True),
+        ),
+    ]
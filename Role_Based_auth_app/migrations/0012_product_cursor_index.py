@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0011_apikey_key_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['organization', '-created_at'], name='prod_org_created'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0012_product_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='resource_type',
+            field=models.CharField(choices=[('API', 'API'), ('User', 'User'), ('Product', 'Product')], max_length=100),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Role_Based_auth_app', '0013_activitylog_resource_type_choices'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='Role_Based__organiz_1de9bc_idx',
+        ),
+    ]
@@ -1,11 +1,32 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, Now
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
+import base64
+import hashlib
 import uuid
 import secrets
 
+# Role -> permissions, built once at import; owners hold every permission
+_ALL = frozenset({'all'})
+_NO_PERMISSIONS = frozenset()
+_ROLE_PERMISSIONS = {
+    'owner': _ALL,
+    'admin': frozenset({'create_user', 'delete_user', 'create_product', 'delete_product', 'view_analytics'}),
+    'manager': frozenset({'create_product', 'edit_product', 'view_products'}),
+    'user': frozenset({'view_products', 'create_order'}),
+    'viewer': frozenset({'view_products'}),
+}
+
+class OrgRelatedManager(models.Manager):
+    """Manager that joins organization, for models whose __str__ reads organization.name"""
+    
+    def get_queryset(self):
+        return super().get_queryset().select_related('organization')
+
+
 class Organization(models.Model):
     """Multi-tenant organization model"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -84,6 +105,11 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['organization', 'role'], name='user_org_role'),
+        ]
+    
     def __str__(self):
         return f"{self.username} ({self.role}) - {self.organization}"
     
@@ -93,20 +119,44 @@ class User(AbstractUser):
     
     def has_permission(self, permission):
         """Check if user has specific permission based on role"""
-        role_permissions = {
-            'owner': ['all'],
-            'admin': ['create_user', 'delete_user', 'create_product', 'delete_product', 'view_analytics'],
-            'manager': ['create_product', 'edit_product', 'view_products'],
-            'user': ['view_products', 'create_order'],
-            'viewer': ['view_products'],
-        }
-        user_permissions = role_permissions.get(self.role, [])
-        return permission in user_permissions or 'all' in user_permissions
+        user_permissions = _ROLE_PERMISSIONS.get(self.role, _NO_PERMISSIONS)
+        return user_permissions is _ALL or permission in user_permissions
+
+class OrganizationNameMixin:
+    """
+    For models with a denormalized organization_name: remembers which
+    organization the loaded name belongs to, see _sync_organization_name.
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._organization_name_for = instance.__dict__.get('organization_id')
+        return instance
 
-class Category(models.Model):
+def _sync_organization_name(instance):
+    """
+    Fill the denormalized organization_name column. A loaded organization is
+    reused; otherwise the name is fetched when the column is still empty or
+    organization_id no longer matches the organization the name was read for.
+    """
+    if not instance.organization_id:
+        return
+    if type(instance).organization.is_cached(instance):
+        instance.organization_name = instance.organization.name
+    elif (not instance.organization_name
+            or instance.organization_id != getattr(instance, '_organization_name_for', None)):
+        instance.organization_name = Organization.objects.filter(
+            pk=instance.organization_id
+        ).values_list('name', flat=True).first() or ''
+    instance._organization_name_for = instance.organization_id
+
+class Category(OrganizationNameMixin, models.Model):
     """Product categories with organization isolation"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='categories')
+    # Copy of organization.name for __str__, kept current by the Organization post_save signal
+    organization_name = models.CharField(max_length=255, blank=True, editable=False)
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=100)
     description = models.TextField(blank=True)
@@ -124,7 +174,44 @@ class Category(models.Model):
         verbose_name_plural = 'Categories'
     
     def __str__(self):
-        return f"{self.name} ({self.organization.name})"
+        return f"{self.name} ({self.organization_name})"
+    
+    def save(self, *args, **kwargs):
+        _sync_organization_name(self)
+        super().save(*args, **kwargs)
+
+def _effective_price():
+    """Database-side Product.effective_price: a missing or zero sale price falls back to price"""
+    return models.Case(
+        models.When(models.Q(sale_price__isnull=True) | models.Q(sale_price=0), then=models.F('price')),
+        default=models.F('sale_price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+class ProductQuerySet(models.QuerySet):
+    def with_derived(self):
+        """Annotate effective_price_db and is_in_stock_db for the matching properties"""
+        return self.annotate(
+            effective_price_db=_effective_price(),
+            is_in_stock_db=models.Case(
+                models.When(quantity__gt=0, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+    
+    def with_profit_margin(self):
+        """Annotate profit_margin_db, the database-side equivalent of Product.profit_margin"""
+        effective_price = _effective_price()
+        return self.annotate(profit_margin_db=models.Case(
+            models.When(models.Q(cost_price__isnull=True) | models.Q(cost_price=0), then=models.Value(0.0)),
+            default=models.ExpressionWrapper(
+                # Cast so numeric columns holding whole numbers are not divided as integers
+                (effective_price - models.F('cost_price')) * 100.0 / Cast(effective_price, models.FloatField()),
+                output_field=models.FloatField(),
+            ),
+            output_field=models.FloatField(),
+        ))
 
 class Product(models.Model):
     """Enhanced product model with organization isolation"""
@@ -174,26 +261,44 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['organization', 'is_active']),
-            models.Index(fields=['organization', 'category']),
+            # Also serves organization + is_active alone as a leading prefix
+            models.Index(fields=['organization', 'is_active', 'is_featured'], name='prod_org_active_feat'),
+            # Only the active-listing shape gets a composite index; other category
+            # lookups use the category FK index, as a category has a single organization
+            models.Index(fields=['organization', 'category'], condition=models.Q(is_active=True), name='prod_org_cat_active'),
             models.Index(fields=['sku']),
+            # Keyset (cursor) pages of an organization's products in the default ordering
+            models.Index(fields=['organization', '-created_at'], name='prod_org_created'),
         ]
     
     def __str__(self):
+        return self.display_name
+    
+    @property
+    def display_name(self):
         return self.product_name or self.name
     
     def save(self, *args, **kwargs):
+        # Partial saves that don't write name or sku skip the backfills below
+        update_fields = kwargs.get('update_fields')
         # Auto-populate name from product_name for backward compatibility
-        if not self.name and self.product_name:
+        if not self.name and self.product_name and (update_fields is None or 'name' in update_fields):
             self.name = self.product_name
         # Auto-generate SKU if not provided
-        if not self.sku:
-            self.sku = f"PRD-{uuid.uuid4().hex[:8].upper()}"
+        if not self.sku and (update_fields is None or 'sku' in update_fields):
+            self.sku = self.generate_sku()
         super().save(*args, **kwargs)
     
+    @staticmethod
+    def generate_sku():
+        # 4 random bytes give the same 8 hex digits without building a UUID
+        return 'PRD-' + secrets.token_hex(4).upper()
+    
     @property
     def effective_price(self):
         return self.sale_price if self.sale_price else self.price
@@ -223,10 +328,26 @@ class ProductImage(models.Model):
         ordering = ['sort_order', 'created_at']
     
     def save(self, *args, **kwargs):
-        if self.is_primary:
-            # Ensure only one primary image per product
-            ProductImage.objects.filter(product=self.product, is_primary=True).update(is_primary=False)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if not self.is_primary or (update_fields is not None and 'is_primary' not in update_fields):
+            super().save(*args, **kwargs)
+            return
+        # Ensure only one primary image per product; the UPDATE's row locks keep
+        # concurrent saves from both ending up primary
+        with transaction.atomic():
+            ProductImage.objects.filter(
+                product_id=self.product_id, is_primary=True
+            ).exclude(pk=self.pk).update(is_primary=False)
+            super().save(*args, **kwargs)
+
+class SubscriptionQuerySet(models.QuerySet):
+    def with_derived(self):
+        """Annotate is_active_db, comparing against the database clock once per query"""
+        return self.annotate(is_active_db=models.Case(
+            models.When(status='active', current_period_end__gt=Now(), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
 
 class Subscription(models.Model):
     """Organization subscription management"""
@@ -250,6 +371,9 @@ class Subscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SubscriptionQuerySet.as_manager()
+    objects_with_org = OrgRelatedManager()
+    
     def __str__(self):
         return f"{self.organization.name} - {self.plan}"
     
@@ -257,6 +381,31 @@ class Subscription(models.Model):
     def is_active(self):
         return self.status == 'active' and timezone.now() < self.current_period_end
 
+class UsageQuerySet(models.QuerySet):
+    def at_least_percent(self, percentage):
+        """Rows with a limit whose usage_percentage is at least percentage, compared in integers"""
+        return self.alias(scaled_count=models.F('count') * 100).filter(
+            limit__gt=0, scaled_count__gte=models.F('limit') * percentage
+        )
+    
+    def with_derived(self):
+        """Annotate usage_percentage_db and is_limit_exceeded_db for the matching properties"""
+        has_limit = models.Q(limit__gt=0)
+        return self.annotate(
+            usage_percentage_db=models.Case(
+                models.When(has_limit, then=Cast('count', models.FloatField()) / models.F('limit') * 100),
+                default=models.Value(0.0),
+                output_field=models.FloatField(),
+            ),
+            is_limit_exceeded_db=models.Case(
+                # The property returns the missing limit itself, so it renders as null
+                models.When(limit__isnull=True, then=models.Value(None)),
+                models.When(has_limit & models.Q(count__gte=models.F('limit')), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
 class Usage(models.Model):
     """Track organization usage for billing and limits"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -277,6 +426,8 @@ class Usage(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = UsageQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['organization', 'feature', 'period_start']
         indexes = [
@@ -284,6 +435,22 @@ class Usage(models.Model):
             models.Index(fields=['period_start', 'period_end']),
         ]
     
+    @classmethod
+    def increment(cls, organization_id, feature, period_start, period_end, n=1, limit=None):
+        """
+        Add n to the counter for the period with a single UPDATE. The row is
+        only created on the first tick of a period.
+        """
+        lookup = {'organization_id': organization_id, 'feature': feature, 'period_start': period_start}
+        if cls.objects.filter(**lookup).update(count=models.F('count') + n):
+            return
+        usage, created = cls.objects.get_or_create(
+            **lookup, defaults={'period_end': period_end, 'count': n, 'limit': limit}
+        )
+        if not created:
+            # Another worker created the row first
+            cls.objects.filter(pk=usage.pk).update(count=models.F('count') + n)
+    
     @property
     def usage_percentage(self):
         if self.limit and self.limit > 0:
@@ -294,10 +461,14 @@ class Usage(models.Model):
     def is_limit_exceeded(self):
         return self.limit and self.limit > 0 and self.count >= self.limit
 
-class FileUpload(models.Model):
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+class FileUpload(OrganizationNameMixin, models.Model):
     """File upload management with organization isolation"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='files')
+    # Copy of organization.name for __str__, kept current by the Organization post_save signal
+    organization_name = models.CharField(max_length=255, blank=True, editable=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploaded_files')
     
     # File details
@@ -319,10 +490,17 @@ class FileUpload(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'is_public', 'file_type'], name='file_org_public_type'),
+            models.Index(fields=['organization', 'uploaded_by'], name='file_org_uploader'),
+        ]
+    
     def __str__(self):
-        return f"{self.original_name} - {self.organization.name}"
+        return f"{self.original_name} - {self.organization_name}"
     
     def save(self, *args, **kwargs):
+        _sync_organization_name(self)
         if self.file:
             self.file_size = self.file.size
             self.original_name = self.original_name or self.file.name
@@ -332,11 +510,24 @@ class FileUpload(models.Model):
     def file_size_formatted(self):
         """Return human readable file size"""
         size = self.file_size
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} TB"
+        # Each unit spans 10 bits, so the bit length picks it without a division loop
+        unit = min(max(size.bit_length() - 1, 0) // 10, len(_SIZE_UNITS) - 1)
+        return f"{size / (1 << (unit * 10)):.1f} {_SIZE_UNITS[unit]}"
+
+_API_KEY_PREFIX = b'sk_'
+
+class APIKeyQuerySet(models.QuerySet):
+    def for_key(self, key):
+        """Keys matching a presented raw key, looked up through the unique hash"""
+        return self.filter(key_hash=APIKey.hash_key(key))
+    
+    def with_derived(self):
+        """Annotate is_expired_db, comparing against the database clock once per query"""
+        return self.annotate(is_expired_db=models.Case(
+            models.When(expires_at__lt=Now(), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
 
 class APIKey(models.Model):
     """API keys for organization access"""
@@ -346,7 +537,8 @@ class APIKey(models.Model):
     
     # Key details
     name = models.CharField(max_length=255)
-    key = models.CharField(max_length=255, unique=True)
+    # Only a digest of the key is stored; the key itself is shown once on creation
+    key_hash = models.BinaryField(max_length=32, unique=True, editable=False)
     key_preview = models.CharField(max_length=20)
     
     # Permissions and limits
@@ -364,6 +556,15 @@ class APIKey(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = APIKeyQuerySet.as_manager()
+    objects_with_org = OrgRelatedManager()
+    
+    class Meta:
+        indexes = [
+            # Revoked keys are kept for history but never looked up
+            models.Index(fields=['organization', 'expires_at'], condition=models.Q(is_active=True), name='apikey_org_active_expiry'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.organization.name}"
     
@@ -373,10 +574,22 @@ class APIKey(models.Model):
             return timezone.now() > self.expires_at
         return False
     
+    @staticmethod
+    def hash_key(key):
+        """Digest stored for and looked up by a presented key"""
+        if isinstance(key, str):
+            # Generated keys are ASCII, but a presented one may not be; it must simply not match
+            key = key.encode('utf-8')
+        return hashlib.blake2b(key, digest_size=32).digest()
+    
     def save(self, *args, **kwargs):
-        if not self.key:
-            self.key = f"sk_{secrets.token_urlsafe(32)}"
-            self.key_preview = self.key[:8] + '...'
+        if not self.key_hash:
+            # Same format as token_urlsafe(32): 32 random bytes are 43 base64 chars plus one '='
+            key = _API_KEY_PREFIX + base64.urlsafe_b64encode(secrets.token_bytes(32))[:43]
+            self.key_hash = self.hash_key(key)
+            self.key_preview = key[:8].decode('ascii') + '...'
+            # Not persisted; only available on the instance that created the key
+            self.raw_key = key.decode('ascii')
         super().save(*args, **kwargs)
 
 class Notification(models.Model):
@@ -414,7 +627,10 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', 'is_read']),
+            # NotificationFilter fields plus the default ordering
+            models.Index(fields=['user', 'is_read', 'notification_type', '-created_at'], name='notif_user_read_type_created'),
+            # Unread listing; read notifications are served by the index above
+            models.Index(fields=['user', '-created_at'], condition=models.Q(is_read=False), name='notif_user_unread'),
             models.Index(fields=['organization', 'created_at']),
         ]
     
@@ -423,9 +639,13 @@ class Notification(models.Model):
     
     def mark_as_read(self):
         if not self.is_read:
-            self.is_read = True
-            self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            now = timezone.now()
+            # Conditional UPDATE: a concurrent call that got there first keeps its read_at
+            if Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True, read_at=now):
+                self.is_read = True
+                self.read_at = now
+            else:
+                self.refresh_from_db(fields=['is_read', 'read_at'])
 
 class ActivityLog(models.Model):
     """Track user and system activities"""
@@ -439,6 +659,15 @@ class ActivityLog(models.Model):
         ('export', 'Export'),
         ('import', 'Import'),
     )
+    # Every resource_type the app writes (signals and APIAnalyticsMiddleware)
+    RESOURCE_API = 'API'
+    RESOURCE_USER = 'User'
+    RESOURCE_PRODUCT = 'Product'
+    RESOURCE_TYPE_CHOICES = (
+        (RESOURCE_API, 'API'),
+        (RESOURCE_USER, 'User'),
+        (RESOURCE_PRODUCT, 'Product'),
+    )
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='activity_logs')
@@ -446,7 +675,7 @@ class ActivityLog(models.Model):
     
     # Activity details
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
-    resource_type = models.CharField(max_length=100)
+    resource_type = models.CharField(max_length=100, choices=RESOURCE_TYPE_CHOICES)
     resource_id = models.CharField(max_length=255, null=True, blank=True)
     description = models.TextField()
     
@@ -1,7 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class StandardResultsSetPagination(PageNumberPagination):
  page_size = 20
  page_size_query_param = 'page_size'
- max_page_size = 200
\ No newline at end of file
+ max_page_size = 200
+
+
+class CursorResultsSetPagination(CursorPagination):
+ """Keyset pagination over the default -created_at ordering: no COUNT query and no OFFSET scan"""
+ page_size = 20
+ page_size_query_param = 'page_size'
+ max_page_size = 200
+ ordering = '-created_at'
@@ -1,8 +1,64 @@
+import functools
+
 from rest_framework import permissions
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+_SAFE = frozenset(permissions.SAFE_METHODS)
+_OWNER_ROLES = frozenset(('owner',))
+_ADMIN_ROLES = frozenset(('admin', 'owner'))
+_MANAGER_ROLES = frozenset(('manager', 'admin', 'owner'))
+
+
+def _role(request):
+    """
+    The authenticated user's role, read once and kept on the request so every
+    permission class evaluated for it reuses the value. The role comes from the
+    user row rather than the token's role claim, which can be stale.
+    """
+    role = getattr(request, '_cached_role', None)
+    if role is None:
+        role = request._cached_role = request.user.role
+    return role
+
+
+def request_memoize(fn):
+    """
+    Cache a permission method's result on the request, keyed by the
+    permission class, the method and its remaining arguments, so a check
+    repeated within one request is evaluated once.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, request, *args):
+        memo = request.__dict__.setdefault('_perm_memo', {})
+        # The class is part of the key as subclasses share inherited methods
+        key = (type(self), fn.__name__, *args)
+        if key not in memo:
+            memo[key] = fn(self, request, *args)
+        return memo[key]
+    return wrapper
+
+
+class _RoleGate(permissions.BasePermission):
+    """
+    Base for the role-based permissions: the request must be authenticated and
+    the user's role in required_roles. With safe_ok, safe methods only need an
+    authenticated user.
+    """
+    required_roles = frozenset()
+    allow_staff = True
+    safe_ok = False
+    
+    @request_memoize
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        if self.safe_ok and request.method in _SAFE:
+            return True
+        return _role(request) in self.required_roles or (self.allow_staff and user.is_staff)
+
 
 class IsOwner(permissions.BasePermission):
     """
@@ -12,33 +68,25 @@ class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
-        if request.method in permissions.SAFE_METHODS:
+        if request.method in _SAFE:
             return True
         
         # Write permissions are only allowed to the owner of the object.
         return obj.created_by == request.user
 
 
-class IsAdminOrOwner(permissions.BasePermission):
+class IsAdminOrOwner(_RoleGate):
     """
     Custom permission to allow access to admin users or owners.
     """
-    
-    def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            return request.user.role in ['admin', 'owner'] or request.user.is_staff
-        return False
+    required_roles = _ADMIN_ROLES
 
 
-class IsManagerOrAbove(permissions.BasePermission):
+class IsManagerOrAbove(_RoleGate):
     """
     Custom permission to allow access to manager, admin, or owner roles.
     """
-    
-    def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            return request.user.role in ['manager', 'admin', 'owner'] or request.user.is_staff
-        return False
+    required_roles = _MANAGER_ROLES
 
 
 class IsSameOrganization(permissions.BasePermission):
@@ -52,50 +100,40 @@ class IsSameOrganization(permissions.BasePermission):
         
         # Check if object has organization attribute
         if hasattr(obj, 'organization'):
-            return obj.organization == request.user.organization
+            return obj.organization_id == request.user.organization_id
         
         # Check if object is a user in same organization
         if isinstance(obj, User):
-            return obj.organization == request.user.organization
+            return obj.organization_id == request.user.organization_id
         
         return True
 
 
-class CanCreateUsers(permissions.BasePermission):
+class CanCreateUsers(_RoleGate):
     """
     Permission for creating new users (admin and owner only).
     """
-    
-    def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            return request.user.role in ['admin', 'owner'] or request.user.is_staff
-        return False
+    required_roles = _ADMIN_ROLES
 
 
-class CanManageProducts(permissions.BasePermission):
+class CanManageProducts(_RoleGate):
     """
     Permission for managing products (manager and above).
     """
-    
-    def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            if request.method in permissions.SAFE_METHODS:
-                return True
-            return request.user.role in ['manager', 'admin', 'owner'] or request.user.is_staff
-        return False
+    required_roles = _MANAGER_ROLES
+    safe_ok = True
 
 
-class CanDeleteProducts(permissions.BasePermission):
+class CanDeleteProducts(_RoleGate):
     """
     Permission for deleting products (admin and owner only).
     """
+    required_roles = _ADMIN_ROLES
     
     def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            if request.method != 'DELETE':
-                return True
-            return request.user.role in ['admin', 'owner'] or request.user.is_staff
-        return False
+        if request.method != 'DELETE':
+            return bool(request.user and request.user.is_authenticated)
+        return super().has_permission(request, view)
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -107,7 +145,7 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
-        if request.method in permissions.SAFE_METHODS:
+        if request.method in _SAFE:
             return True
         
         # Write permissions are only allowed to the owner of the object.
@@ -121,26 +159,18 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return False
 
 
-class IsOrganizationOwner(permissions.BasePermission):
+class IsOrganizationOwner(_RoleGate):
     """
     Permission for organization owners only.
     """
-    
-    def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            return request.user.role == 'owner' or request.user.is_staff
-        return False
+    required_roles = _OWNER_ROLES
 
 
-class CanViewAnalytics(permissions.BasePermission):
+class CanViewAnalytics(_RoleGate):
     """
     Permission for viewing analytics (admin and owner).
     """
-    
-    def has_permission(self, request, view):
-        if request.user and request.user.is_authenticated:
-            return request.user.role in ['admin', 'owner'] or request.user.is_staff
-        return False
+    required_roles = _ADMIN_ROLES
 
 
 class IsAPIKeyOwner(permissions.BasePermission):
@@ -148,10 +178,11 @@ class IsAPIKeyOwner(permissions.BasePermission):
     Permission for API key management.
     """
     
+    @request_memoize
     def has_object_permission(self, request, view, obj):
         if not request.user or not request.user.is_authenticated:
             return False
         
         # Check if user is from same organization and has appropriate role
-        return (obj.organization == request.user.organization and 
-                request.user.role in ['admin', 'owner'])
+        return (obj.organization_id == request.user.organization_id and 
+                _role(request) in _ADMIN_ROLES)
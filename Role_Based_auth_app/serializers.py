@@ -1,14 +1,49 @@
 from .models import ProductImage, Product, Subscription, Usage, FileUpload, APIKey, Notification, ActivityLog, Organization, User, Category
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+class AnnotatedFieldMixin:
+    """
+    Read-only field that uses the queryset's ``<source>_db`` annotation when
+    present and falls back to the model property for objects loaded without it.
+    """
+    def get_attribute(self, instance):
+        annotated = f'{self.source}_db'
+        if annotated in instance.__dict__:
+            return instance.__dict__[annotated]
+        return super().get_attribute(instance)
+
+class AnnotatedBooleanField(AnnotatedFieldMixin, serializers.BooleanField):
+    pass
+
+class AnnotatedDecimalField(AnnotatedFieldMixin, serializers.DecimalField):
+    pass
+
+class AnnotatedFloatField(AnnotatedFieldMixin, serializers.FloatField):
+    pass
+
+class AnnotatedModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer for Annotated*Field fields. An update drops the annotations
+    loaded with the instance, which describe it before the save, so the
+    response is rendered from the model properties.
+    """
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        for field in self.fields.values():
+            if isinstance(field, AnnotatedFieldMixin):
+                instance.__dict__.pop(f'{field.source}_db', None)
+        return instance
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
         token['username'] = user.username
-        token['role'] = user.role
-        token['role'] = user.role if user.role else None
+        token['role'] = user.role or None
+        token['org'] = str(user.organization_id) if user.organization_id else None
         return token
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -17,14 +52,16 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'created_at')
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(AnnotatedModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
-    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    is_in_stock = serializers.BooleanField(read_only=True)
-    profit_margin = serializers.SerializerMethodField()
+    effective_price = AnnotatedDecimalField(max_digits=10, decimal_places=2, read_only=True)
+    is_in_stock = AnnotatedBooleanField(read_only=True)
+    profit_margin = AnnotatedFloatField(read_only=True)
 
-    def get_profit_margin(self, obj):
-        return float(obj.profit_margin) if obj.profit_margin is not None else 0
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the nested images for a whole page in one query and compute derived values in SQL"""
+        return queryset.prefetch_related('images').with_derived().with_profit_margin()
 
     class Meta:
         model = Product
@@ -34,17 +71,39 @@ class ProductSerializer(serializers.ModelSerializer):
             'view_count', 'rating', 'review_count', 'sku', 'effective_price', 'is_in_stock'
         )
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    is_active = serializers.BooleanField(read_only=True)
+class ProductListSerializer(ProductSerializer):
+    """Slimmer product representation for list responses"""
+    profit_margin = None
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related('images').with_derived()
+
+    class Meta(ProductSerializer.Meta):
+        fields = (
+            'id', 'product_name', 'name', 'slug', 'price', 'sale_price', 'quantity', 'sku',
+            'is_active', 'rating', 'review_count', 'effective_price', 'is_in_stock', 'images'
+        )
+
+class SubscriptionSerializer(AnnotatedModelSerializer):
+    is_active = AnnotatedBooleanField(read_only=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.with_derived()
 
     class Meta:
         model = Subscription
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
 
-class UsageSerializer(serializers.ModelSerializer):
-    usage_percentage = serializers.FloatField(read_only=True)
-    is_limit_exceeded = serializers.BooleanField(read_only=True)
+class UsageSerializer(AnnotatedModelSerializer):
+    usage_percentage = AnnotatedFloatField(read_only=True)
+    is_limit_exceeded = AnnotatedBooleanField(read_only=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.with_derived()
 
     class Meta:
         model = Usage
@@ -59,13 +118,19 @@ class FileUploadSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'uploaded_by', 'organization', 'file_size', 'download_count', 'created_at', 'updated_at')
 
-class APIKeySerializer(serializers.ModelSerializer):
-    is_expired = serializers.BooleanField(read_only=True)
+class APIKeySerializer(AnnotatedModelSerializer):
+    is_expired = AnnotatedBooleanField(read_only=True)
+    # Present only in the response that creates the key
+    key = serializers.CharField(source='raw_key', read_only=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.with_derived()
 
     class Meta:
         model = APIKey
-        fields = '__all__'
-        read_only_fields = ('id', 'key', 'key_preview', 'usage_count', 'last_used', 'created_at', 'updated_at')
+        exclude = ('key_hash',)
+        read_only_fields = ('id', 'key_preview', 'usage_count', 'last_used', 'created_at', 'updated_at')
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -79,6 +144,14 @@ class ActivityLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'created_at')
 
+class ActivityLogListSerializer(ActivityLogSerializer):
+    """Activity log list without the bulky user_agent and metadata columns"""
+    class Meta(ActivityLogSerializer.Meta):
+        fields = (
+            'id', 'organization', 'user', 'action', 'resource_type', 'resource_id',
+            'description', 'ip_address', 'request_path', 'request_method', 'created_at'
+        )
+
 class OrganizationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Organization
@@ -88,6 +161,31 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
+        # Username uniqueness is left to the UNIQUE constraint (see save_user)
+        # rather than checked with a SELECT before every insert
+        extra_kwargs = {'username': {'validators': [UnicodeUsernameValidator()]}}
+
+    def save_user(self, save, *args):
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError:
+            username = args[-1].get('username')
+            # On update the payload usually repeats the user's own username
+            taken = User.objects.filter(username=username)
+            if self.instance is not None:
+                taken = taken.exclude(pk=self.instance.pk)
+            if username is None or not taken.exists():
+                raise
+            raise serializers.ValidationError(
+                {'username': [User._meta.get_field('username').error_messages['unique']]}
+            )
+
+    def create(self, validated_data):
+        return self.save_user(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self.save_user(super().update, instance, validated_data)
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,149 +1,148 @@
-from django.db.models.signals import post_save, post_delete, pre_save
-from django.dispatch import receiver
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth import get_user_model
-from .models import Organization, User, Product, ActivityLog, Usage, Subscription
+from .models import Organization, User, Product, Usage, Subscription, Category, FileUpload, ActivityLog
+from .activity import log_activity
+from .caching import invalidate_organization_cache
 from django.utils import timezone
 
 User = get_user_model()
 
 
-@receiver(post_save, sender=User)
 def create_user_profile_activity(sender, instance, created, **kwargs):
-    """Create activity log when user is created or updated"""
-    if created:
-        ActivityLog.objects.create(
-            organization=instance.organization,
-            user=instance,
-            action='create',
-            resource_type='User',
-            resource_id=str(instance.id),
-            description=f"User {instance.username} was created"
-        )
-    else:
-        ActivityLog.objects.create(
-            organization=instance.organization,
-            user=instance,
-            action='update',
-            resource_type='User', 
-            resource_id=str(instance.id),
-            description=f"User {instance.username} was updated"
-        )
-
-
-@receiver(post_save, sender=Product)
+    """Log activity when user is created or updated"""
+    action = 'create' if created else 'update'
+    log_activity(
+        organization_id=instance.organization_id,
+        user_id=instance.pk,
+        action=action,
+        resource_type=ActivityLog.RESOURCE_USER,
+        resource_id=str(instance.id),
+        description=f"User {instance.username} was {action}d"
+    )
+
+
 def create_product_activity(sender, instance, created, **kwargs):
-    """Create activity log when product is created or updated"""
-    if created:
-        ActivityLog.objects.create(
-            organization=instance.organization,
-            user=instance.created_by,
-            action='create',
-            resource_type='Product',
-            resource_id=str(instance.id),
-            description=f"Product {instance.product_name or instance.name} was created"
-        )
-    else:
-        ActivityLog.objects.create(
-            organization=instance.organization,
-            user=instance.updated_by,
-            action='update',
-            resource_type='Product',
-            resource_id=str(instance.id),
-            description=f"Product {instance.product_name or instance.name} was updated"
-        )
-
-
-@receiver(post_delete, sender=Product)
+    """Log activity when product is created or updated"""
+    action = 'create' if created else 'update'
+    log_activity(
+        organization_id=instance.organization_id,
+        user_id=instance.created_by_id if created else instance.updated_by_id,
+        action=action,
+        resource_type=ActivityLog.RESOURCE_PRODUCT,
+        resource_id=str(instance.id),
+        description=f"Product {instance.display_name} was {action}d"
+    )
+
+
 def create_product_delete_activity(sender, instance, **kwargs):
-    """Create activity log when product is deleted"""
-    ActivityLog.objects.create(
-        organization=instance.organization,
-        user=None,  # We can't track who deleted it from here
+    """Log activity when product is deleted"""
+    log_activity(
+        organization_id=instance.organization_id,
+        user_id=None,  # We can't track who deleted it from here
         action='delete',
-        resource_type='Product',
+        resource_type=ActivityLog.RESOURCE_PRODUCT,
         resource_id=str(instance.id),
-        description=f"Product {instance.product_name or instance.name} was deleted"
+        description=f"Product {instance.display_name} was deleted"
     )
 
 
-@receiver(post_save, sender=Organization)
+def sync_organization_name(sender, instance, created, update_fields=None, **kwargs):
+    """Propagate an organization rename to the denormalized organization_name columns"""
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+    # The exclude() turns saves that did not change the name into cheap no-ops
+    for model in (Category, FileUpload):
+        model.objects.filter(organization=instance).exclude(
+            organization_name=instance.name
+        ).update(organization_name=instance.name)
+
+
+def clear_organization_cache(sender, instance, **kwargs):
+    """Drop the organization's cached API responses after it changes"""
+    invalidate_organization_cache(instance.pk)
+
+
 def create_organization_subscription(sender, instance, created, **kwargs):
     """Create default subscription when organization is created"""
     if created:
+        now = timezone.now()
         # Create basic subscription for new organizations
-        Subscription.objects.get_or_create(
-            organization=instance,
-            defaults={
-                'plan': 'basic',
-                'status': 'active',
-                'current_period_start': timezone.now(),
-                'current_period_end': timezone.now() + timezone.timedelta(days=30)
-            }
-        )
+        Subscription.objects.bulk_create([
+            Subscription(
+                organization=instance,
+                plan='basic',
+                status='active',
+                current_period_start=now,
+                current_period_end=now + timezone.timedelta(days=30)
+            )
+        ], ignore_conflicts=True)
         
         # Create initial usage records
+        period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        period_end = now.replace(day=1, hour=23, minute=59, second=59, microsecond=999999) + timezone.timedelta(days=31)
         features = ['users', 'products', 'api_calls', 'storage']
-        for feature in features:
-            Usage.objects.get_or_create(
+        Usage.objects.bulk_create([
+            Usage(
                 organization=instance,
                 feature=feature,
-                period_start=timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0),
-                period_end=timezone.now().replace(day=1, hour=23, minute=59, second=59, microsecond=999999) + timezone.timedelta(days=31),
-                defaults={
-                    'count': 0,
-                    'limit': 100 if feature == 'products' else 1000
-                }
+                period_start=period_start,
+                period_end=period_end,
+                count=0,
+                limit=100 if feature == 'products' else 1000
             )
+            for feature in features
+        ], ignore_conflicts=True)
+
+
+@lru_cache(maxsize=4)
+def _month_bounds(year, month):
+    """Start of the given UTC month and of the following one, the usage counters' period"""
+    current_month = datetime(year, month, 1, tzinfo=dt_timezone.utc)
+    next_month = (current_month + timezone.timedelta(days=32)).replace(day=1)
+    return current_month, next_month
 
 
-@receiver(post_save, sender=User)
 def update_user_count(sender, instance, created, **kwargs):
     """Update organization's user usage count"""
-    if created and instance.organization:
-        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        next_month = (current_month + timezone.timedelta(days=32)).replace(day=1)
-        
-        usage, created_usage = Usage.objects.get_or_create(
-            organization=instance.organization,
-            feature='users',
-            period_start=current_month,
-            period_end=next_month,
-            defaults={'count': 0, 'limit': 5}
-        )
-        
-        if not created_usage:
-            usage.count += 1
-            usage.save()
+    if created and instance.organization_id:
+        now = timezone.now()
+        current_month, next_month = _month_bounds(now.year, now.month)
+        Usage.increment(instance.organization_id, 'users', current_month, next_month, limit=5)
 
 
-@receiver(post_save, sender=Product)
 def update_product_count(sender, instance, created, **kwargs):
     """Update organization's product usage count"""
-    if created and instance.organization:
-        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        next_month = (current_month + timezone.timedelta(days=32)).replace(day=1)
-        
-        usage, created_usage = Usage.objects.get_or_create(
-            organization=instance.organization,
-            feature='products',
-            period_start=current_month,
-            period_end=next_month,
-            defaults={'count': 0, 'limit': 100}
-        )
-        
-        if not created_usage:
-            usage.count += 1
-            usage.save()
-
-
-@receiver(pre_save, sender=User)
-def update_last_activity(sender, instance, **kwargs):
-    """Update user's last activity timestamp"""
-    if instance.pk:  # Only for existing users
-        try:
-            old_instance = User.objects.get(pk=instance.pk)
-            if old_instance.last_login != instance.last_login:
-                instance.last_activity = timezone.now()
-                instance.login_count = (instance.login_count or 0) + 1
-        except User.DoesNotExist:
-            pass
+    if created and instance.organization_id:
+        now = timezone.now()
+        current_month, next_month = _month_bounds(now.year, now.month)
+        Usage.increment(instance.organization_id, 'products', current_month, next_month, limit=100)
+
+
+def update_last_activity(sender, instance, created, update_fields=None, **kwargs):
+    """Update user's last activity timestamp and login count on login"""
+    # Logins save with update_fields=['last_login'] (django.contrib.auth and
+    # simplejwt's UPDATE_LAST_LOGIN), so other saves are skipped without a query
+    if created or not update_fields or 'last_login' not in update_fields:
+        return
+    now = timezone.now()
+    User.objects.filter(pk=instance.pk).update(last_activity=now, login_count=F('login_count') + 1)
+    instance.last_activity = now
+    instance.login_count = (instance.login_count or 0) + 1
+
+
+def connect_signals():
+    """Connect the app's receivers; dispatch_uid keeps repeated calls from registering them twice."""
+    post_save.connect(create_user_profile_activity, sender=User, dispatch_uid='user_activity')
+    post_save.connect(create_product_activity, sender=Product, dispatch_uid='product_activity')
+    post_delete.connect(create_product_delete_activity, sender=Product, dispatch_uid='product_delete_activity')
+    post_save.connect(create_organization_subscription, sender=Organization, dispatch_uid='organization_subscription')
+    post_save.connect(sync_organization_name, sender=Organization, dispatch_uid='organization_name_sync')
+    post_save.connect(clear_organization_cache, sender=Organization, dispatch_uid='organization_cache_save')
+    post_delete.connect(clear_organization_cache, sender=Organization, dispatch_uid='organization_cache_delete')
+    post_save.connect(update_user_count, sender=User, dispatch_uid='user_usage_count')
+    post_save.connect(update_product_count, sender=Product, dispatch_uid='product_usage_count')
+    post_save.connect(update_last_activity, sender=User, dispatch_uid='user_last_activity')
@@ -2,86 +2,163 @@ from celery import shared_task
 from django.utils import timezone
 from django.db.models import Count
 from .models import Organization, User, Product, Usage, Subscription
+from datetime import date, datetime
+from functools import lru_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+USAGE_ALERT_THRESHOLD = 80  # usage_percentage
+USAGE_ALERT_BATCH_SIZE = 100
+TOKEN_CLEANUP_BATCH_SIZE = 10000
+ORGANIZATION_CHUNK_SIZE = 500
+
+
+def _active_organization_batches():
+    """
+    Active organization ids, as JSON-serializable lists of at most
+    ORGANIZATION_CHUNK_SIZE, streamed so only one batch is held in memory
+    """
+    batch = []
+    for org_id in Organization.objects.filter(is_active=True).values_list('id', flat=True).iterator(
+        chunk_size=ORGANIZATION_CHUNK_SIZE
+    ):
+        batch.append(str(org_id))
+        if len(batch) == ORGANIZATION_CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 @shared_task
 def calculate_monthly_usage():
-    """Calculate monthly usage for all organizations"""
+    """Calculate monthly usage for all organizations, one subtask per batch of organizations"""
     try:
         current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        next_month = (current_month + timezone.timedelta(days=32)).replace(day=1)
         
-        for org in Organization.objects.filter(is_active=True):
-            # Calculate user count
-            user_count = User.objects.filter(organization=org).count()
-            Usage.objects.update_or_create(
-                organization=org,
-                feature='users',
-                period_start=current_month,
-                period_end=next_month,
-                defaults={'count': user_count, 'limit': get_plan_limit(org.plan, 'users')}
-            )
+        # Each batch is dispatched as it is read, so the ids never pile up here
+        batches = 0
+        for organization_ids in _active_organization_batches():
+            calculate_usage_for_organizations.delay(organization_ids, current_month.isoformat())
+            batches += 1
+        
+        logger.info(f"Queued usage calculation in {batches} batches")
             
-            # Calculate product count
-            product_count = Product.objects.filter(organization=org).count()
-            Usage.objects.update_or_create(
-                organization=org,
-                feature='products',
+    except Exception as e:
+        logger.error(f"Error calculating monthly usage: {str(e)}")
+
+
+@shared_task
+def calculate_usage_for_organizations(organization_ids, period_start):
+    """Calculate usage for the month starting at period_start for a batch of organizations"""
+    try:
+        current_month = datetime.fromisoformat(period_start)
+        next_month = (current_month + timezone.timedelta(days=32)).replace(day=1)
+        
+        organizations = Organization.objects.filter(id__in=organization_ids).values_list('id', 'plan')
+        # One grouped COUNT per feature instead of one COUNT per organization
+        counts = {
+            'users': dict(User.objects.filter(organization_id__in=organization_ids)
+                          .values_list('organization').annotate(Count('id')).order_by()),
+            'products': dict(Product.objects.filter(organization_id__in=organization_ids)
+                             .values_list('organization').annotate(Count('id')).order_by()),
+        }
+        rows = [
+            Usage(
+                organization_id=org_id,
+                feature=feature,
                 period_start=current_month,
                 period_end=next_month,
-                defaults={'count': product_count, 'limit': get_plan_limit(org.plan, 'products')}
+                count=feature_counts.get(org_id, 0),
+                limit=get_plan_limit(plan, feature),
             )
-            
-            logger.info(f"Updated usage for organization {org.name}")
+            for org_id, plan in organizations
+            for feature, feature_counts in counts.items()
+        ]
+        Usage.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['organization', 'feature', 'period_start'],
+            update_fields=['period_end', 'count', 'limit', 'updated_at'],
+        )
+        
+        logger.info(f"Updated usage for {len(rows) // len(counts)} organizations")
             
     except Exception as e:
         logger.error(f"Error calculating monthly usage: {str(e)}")
 
 
+@shared_task
+def flush_product_views():
+    """Write the product views buffered in Redis to Product.view_count"""
+    try:
+        from .view_counts import flush_product_views as flush
+        
+        updated = flush()
+        logger.info(f"Flushed view counts for {updated} products")
+        
+    except Exception as e:
+        logger.error(f"Error flushing product views: {str(e)}")
+
+
 @shared_task
 def send_usage_alerts():
     """Send alerts when organizations are approaching their limits"""
     try:
-        current_usage = Usage.objects.filter(
-            period_start__lte=timezone.now(),
-            period_end__gte=timezone.now()
-        )
+        now = timezone.now()
+        usage_ids = list(Usage.objects.filter(
+            period_start__lte=now,
+            period_end__gte=now
+        ).at_least_percent(USAGE_ALERT_THRESHOLD).values_list('id', flat=True))
         
-        for usage in current_usage:
-            if usage.usage_percentage >= 80:  # 80% threshold
-                send_usage_alert_notification.delay(usage.id)
+        # One task per batch rather than per usage row
+        for i in range(0, len(usage_ids), USAGE_ALERT_BATCH_SIZE):
+            send_usage_alert_notifications.delay(usage_ids[i:i + USAGE_ALERT_BATCH_SIZE])
                 
     except Exception as e:
         logger.error(f"Error sending usage alerts: {str(e)}")
 
 
 @shared_task
-def send_usage_alert_notification(usage_id):
-    """Send individual usage alert notification"""
+def send_usage_alert_notifications(usage_ids):
+    """Send usage alert notifications for a batch of usage records"""
     try:
         from .models import Notification
         
-        usage = Usage.objects.get(id=usage_id)
+        usages = list(Usage.objects.filter(id__in=usage_ids))
         
-        # Create notification for organization owner
-        owners = User.objects.filter(organization=usage.organization, role='owner')
+        # Notify every owner of each usage record's organization
+        owners = {}
+        for owner_id, organization_id in User.objects.filter(
+            organization_id__in={usage.organization_id for usage in usages}, role='owner'
+        ).values_list('id', 'organization_id'):
+            owners.setdefault(organization_id, []).append(owner_id)
         
-        for owner in owners:
-            Notification.objects.create(
-                user=owner,
-                organization=usage.organization,
+        notifications = [
+            Notification(
+                user_id=owner_id,
+                organization_id=usage.organization_id,
                 title=f"Usage Alert: {usage.feature.title()}",
                 message=f"You're currently using {usage.usage_percentage:.1f}% of your {usage.feature} limit.",
                 notification_type='warning'
             )
+            for usage in usages
+            for owner_id in owners.get(usage.organization_id, ())
+        ]
+        Notification.objects.bulk_create(notifications)
             
-        logger.info(f"Sent usage alert for {usage.organization.name} - {usage.feature}")
+        logger.info(f"Sent {len(notifications)} usage alerts for {len(usages)} usage records")
         
     except Exception as e:
-        logger.error(f"Error sending usage alert notification: {str(e)}")
+        logger.error(f"Error sending usage alert notifications: {str(e)}")
+
+
+@shared_task
+def send_usage_alert_notification(usage_id):
+    """Send individual usage alert notification"""
+    send_usage_alert_notifications([usage_id])
 
 
 @shared_task
@@ -92,9 +169,15 @@ def cleanup_expired_tokens():
         
         # Clean up blacklisted tokens older than 30 days
         cutoff_date = timezone.now() - timezone.timedelta(days=30)
-        deleted_count = BlacklistedToken.objects.filter(
-            blacklisted_at__lt=cutoff_date
-        ).delete()[0]
+        expired = BlacklistedToken.objects.filter(blacklisted_at__lt=cutoff_date)
+        
+        # Delete in bounded batches so a large backlog does not hold one long transaction
+        deleted_count = 0
+        while True:
+            batch = list(expired.values_list('pk', flat=True)[:TOKEN_CLEANUP_BATCH_SIZE])
+            if not batch:
+                break
+            deleted_count += BlacklistedToken.objects.filter(pk__in=batch).delete()[0]
         
         logger.info(f"Cleaned up {deleted_count} expired blacklisted tokens")
         
@@ -106,32 +189,36 @@ def cleanup_expired_tokens():
 def update_subscription_status():
     """Update subscription status based on current period end"""
     try:
+        from .models import Notification
+        
+        now = timezone.now()
         expired_subscriptions = Subscription.objects.filter(
-            current_period_end__lt=timezone.now(),
+            current_period_end__lt=now,
             status='active'
         )
-        
-        for subscription in expired_subscriptions:
-            if subscription.cancel_at_period_end:
-                subscription.status = 'cancelled'
-                subscription.save()
-                
-                # Notify organization
-                owners = User.objects.filter(organization=subscription.organization, role='owner')
-                for owner in owners:
-                    from .models import Notification
-                    Notification.objects.create(
-                        user=owner,
-                        organization=subscription.organization,
-                        title="Subscription Cancelled",
-                        message="Your subscription has been cancelled and is no longer active.",
-                        notification_type='error'
-                    )
-            else:
-                # Auto-renew logic would go here
-                pass
+        # Auto-renew logic for the others would go here
+        cancelled = dict(
+            expired_subscriptions.filter(cancel_at_period_end=True).values_list('id', 'organization_id')
+        )
+        if cancelled:
+            Subscription.objects.filter(id__in=cancelled).update(status='cancelled', updated_at=now)
+            
+            # Notify organization
+            notifications = [
+                Notification(
+                    user_id=owner_id,
+                    organization_id=organization_id,
+                    title="Subscription Cancelled",
+                    message="Your subscription has been cancelled and is no longer active.",
+                    notification_type='error'
+                )
+                for owner_id, organization_id in User.objects.filter(
+                    organization_id__in=set(cancelled.values()), role='owner'
+                ).values_list('id', 'organization_id')
+            ]
+            Notification.objects.bulk_create(notifications, batch_size=500)
                 
-        logger.info(f"Updated {expired_subscriptions.count()} expired subscriptions")
+        logger.info(f"Updated {len(cancelled)} expired subscriptions")
         
     except Exception as e:
         logger.error(f"Error updating subscription status: {str(e)}")
@@ -139,48 +226,69 @@ def update_subscription_status():
 
 @shared_task
 def generate_daily_reports():
-    """Generate daily usage and activity reports"""
+    """Generate daily usage and activity reports, one subtask per batch of organizations"""
+    try:
+        yesterday = timezone.now().date() - timezone.timedelta(days=1)
+        
+        for organization_ids in _active_organization_batches():
+            generate_daily_reports_for_organizations.delay(organization_ids, yesterday.isoformat())
+            
+        logger.info("Queued daily reports for all organizations")
+        
+    except Exception as e:
+        logger.error(f"Error generating daily reports: {str(e)}")
+
+
+@shared_task
+def generate_daily_reports_for_organizations(organization_ids, day):
+    """Generate the activity report for one day for a batch of organizations"""
     try:
-        from django.db.models import Count
         from .models import ActivityLog
         
-        today = timezone.now().date()
-        yesterday = today - timezone.timedelta(days=1)
+        day = date.fromisoformat(day)
+        period_start = timezone.datetime.combine(day, timezone.datetime.min.time())
+        period_end = timezone.datetime.combine(day, timezone.datetime.max.time())
         
-        for org in Organization.objects.filter(is_active=True):
-            # Count yesterday's activities
-            activity_count = ActivityLog.objects.filter(
-                organization=org,
-                created_at__date=yesterday
-            ).count()
-            
-            # Count active users yesterday
-            active_users = ActivityLog.objects.filter(
-                organization=org,
-                created_at__date=yesterday,
-                user__isnull=False
-            ).values('user').distinct().count()
-            
-            # Store metrics in Usage model for historical tracking
-            Usage.objects.update_or_create(
-                organization=org,
+        # The day's activity and distinct active users for every organization in one query
+        activity = {
+            organization_id: (activity_count, active_users)
+            for organization_id, activity_count, active_users in ActivityLog.objects.filter(
+                organization_id__in=organization_ids,
+                created_at__date=day
+            ).values_list('organization').annotate(
+                Count('id'), Count('user', distinct=True)
+            ).order_by()
+        }
+        
+        # Store metrics in Usage model for historical tracking
+        rows = []
+        for org_id in Organization.objects.filter(id__in=organization_ids).values_list('id', flat=True):
+            activity_count, active_users = activity.get(org_id, (0, 0))
+            rows.append(Usage(
+                organization_id=org_id,
                 feature='daily_activities',
-                period_start=timezone.datetime.combine(yesterday, timezone.datetime.min.time()),
-                period_end=timezone.datetime.combine(yesterday, timezone.datetime.max.time()),
-                defaults={
-                    'count': activity_count,
-                    'metadata': {'active_users': active_users}
-                }
-            )
+                period_start=period_start,
+                period_end=period_end,
+                count=activity_count,
+                metadata={'active_users': active_users}
+            ))
+        Usage.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['organization', 'feature', 'period_start'],
+            update_fields=['period_end', 'count', 'metadata', 'updated_at'],
+        )
             
-        logger.info("Generated daily reports for all organizations")
+        logger.info(f"Generated daily reports for {len(rows)} organizations")
         
     except Exception as e:
         logger.error(f"Error generating daily reports: {str(e)}")
 
 
+@lru_cache(maxsize=None)
 def get_plan_limit(plan, feature):
-    """Get the limit for a specific feature based on plan"""
+    """Get the limit for a specific feature based on plan; SAAS_CONFIG is fixed for the process lifetime"""
     from django.conf import settings
     
     saas_config = getattr(settings, 'SAAS_CONFIG', {})
@@ -216,21 +324,25 @@ def backup_critical_data():
 def send_welcome_email(user_id):
     """Send welcome email to new users"""
     try:
-        user = User.objects.get(id=user_id)
+        # Only the columns the notification needs; the organization is set by id
+        user = User.objects.filter(id=user_id).values('organization_id', 'first_name', 'username').first()
+        if user is None:
+            logger.error(f"Error sending welcome email: user {user_id} does not exist")
+            return
         
         # This would integrate with your email service
         # For now, just create a notification
         from .models import Notification
         
         Notification.objects.create(
-            user=user,
-            organization=user.organization,
+            user_id=user_id,
+            organization_id=user['organization_id'],
             title="Welcome to the platform!",
-            message=f"Welcome {user.first_name or user.username}! Your account has been created successfully.",
+            message=f"Welcome {user['first_name'] or user['username']}! Your account has been created successfully.",
             notification_type='success'
         )
         
-        logger.info(f"Welcome notification sent to user {user.username}")
+        logger.info(f"Welcome notification sent to user {user['username']}")
         
     except Exception as e:
         logger.error(f"Error sending welcome email: {str(e)}")
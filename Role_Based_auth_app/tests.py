@@ -1,3 +1,782 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import redis
+
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser
+from django.db import DatabaseError, IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import activity, tasks, view_counts
+from .authentication import OrganizationJWTAuthentication
+from .permissions import (CanDeleteProducts, CanManageProducts, IsAdminOrOwner, IsAPIKeyOwner,
+                          IsSameOrganization)
+from .models import (ActivityLog, APIKey, Category, Notification, Organization, Product, Subscription, Usage,
+                     User)
+from .serializers import (MyTokenObtainPairSerializer, ProductListSerializer, ProductSerializer,
+                          SubscriptionSerializer, UsageSerializer, UserSerializer)
+
+
+class ActivityWriterTests(TransactionTestCase):
+    """The background writer shares the test database, so its rows must be committed"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+
+    def log(self, description):
+        activity.log_activity(
+            organization_id=self.organization.pk,
+            action='create',
+            resource_type='Product',
+            resource_id='1',
+            description=description,
+        )
+
+    def wait_for_writer_to_take_queue(self):
+        deadline = time.monotonic() + 2
+        while not activity._activity_queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_exit_flushes_the_batch_the_writer_is_holding(self):
+        self.log("in flight")
+        # The writer has the row in its batch, waiting for the flush interval
+        self.wait_for_writer_to_take_queue()
+        activity._drain_on_exit()
+        self.assertTrue(ActivityLog.objects.filter(description="in flight").exists())
+        self.assertFalse(activity._writer_thread.is_alive())
+
+    def test_writer_restarts_after_exit_drain(self):
+        activity._drain_on_exit()
+        self.log("after restart")
+        activity._drain_on_exit()
+        self.assertTrue(ActivityLog.objects.filter(description="after restart").exists())
+
+    def test_rows_without_organization_are_skipped(self):
+        activity.flush_activity([
+            {'organization_id': None, 'action': 'create', 'resource_type': 'API', 'description': 'orphan'},
+            {'organization_id': self.organization.pk, 'action': 'create', 'resource_type': 'API', 'description': 'kept'},
+        ])
+        self.assertEqual(
+            list(ActivityLog.objects.values_list('description', flat=True)), ['kept']
+        )
+
+    def test_rows_are_queued_only_when_the_transaction_commits(self):
+        with transaction.atomic():
+            self.log("committed")
+            self.assertTrue(activity._activity_queue.empty())
+        activity._drain_on_exit()
+        self.assertTrue(ActivityLog.objects.filter(description="committed").exists())
+
+    def test_rolled_back_rows_are_not_written(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.log("rolled back")
+                raise ValueError
+        activity._drain_on_exit()
+        self.assertFalse(ActivityLog.objects.filter(description="rolled back").exists())
+
+    def test_one_bad_row_does_not_drop_the_batch(self):
+        row = {'action': 'create', 'resource_type': 'API'}
+        with self.assertLogs('Role_Based_auth_app.activity', 'WARNING'):
+            activity.flush_activity([
+                {**row, 'organization_id': self.organization.pk, 'description': 'first'},
+                {**row, 'organization_id': uuid.uuid4(), 'description': 'missing organization'},
+                {**row, 'organization_id': self.organization.pk, 'description': 'last'},
+            ])
+        self.assertEqual(
+            sorted(ActivityLog.objects.values_list('description', flat=True)), ['first', 'last']
+        )
+
+
+class OrganizationJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        self.user = User.objects.create_user(
+            username="alice", password="Secret-pass-123", organization=self.organization, role='owner'
+        )
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return OrganizationJWTAuthentication().authenticate(request)
+
+    def test_user_and_organization_load_in_one_query(self):
+        token = AccessToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            user, validated_token = self.authenticate(token)
+            self.assertEqual(user.organization.name, "Acme")
+        self.assertEqual(user, self.user)
+
+    def test_inactive_user_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_deleted_user_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_token_is_revoked_by_a_password_change(self):
+        # simplejwt modules hold on to the api_settings object, so patch it rather than SIMPLE_JWT
+        with mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True):
+            token = AccessToken.for_user(self.user)
+            self.authenticate(token)
+            self.user.set_password("Another-pass-456")
+            self.user.save(update_fields=['password'])
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+
+
+class UserSerializerUniqueUsernameTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        self.alice = User.objects.create_user(username="alice", password="x", organization=self.organization)
+        self.bob = User.objects.create_user(username="bob", password="x", organization=self.organization)
+
+    def assertUsernameTaken(self, serializer):
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(serializers.ValidationError) as raised:
+            serializer.save()
+        self.assertEqual(
+            raised.exception.detail['username'], ["A user with that username already exists."]
+        )
+
+    def test_duplicate_username_on_create(self):
+        self.assertUsernameTaken(UserSerializer(data={'username': 'alice', 'password': 'x'}))
+
+    def test_duplicate_username_on_update(self):
+        self.assertUsernameTaken(UserSerializer(self.bob, data={'username': 'alice'}, partial=True))
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.username, "bob")
+
+    def test_other_integrity_errors_on_update_are_not_reported_as_username(self):
+        serializer = UserSerializer(self.bob, data={'username': 'bob'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with mock.patch.object(serializers.ModelSerializer, 'update', side_effect=IntegrityError("other")):
+            with self.assertRaises(IntegrityError):
+                serializer.save()
+
+    def test_rename_to_a_free_username(self):
+        serializer = UserSerializer(self.bob, data={'username': 'robert'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().username, "robert")
+
+
+class OrganizationBatchTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Organization.objects.create(name=f"Org {i}", slug=f"org-{i}")
+        Organization.objects.create(name="Closed", slug="closed", is_active=False)
+
+    @mock.patch.object(tasks, 'ORGANIZATION_CHUNK_SIZE', 2)
+    def test_active_organizations_are_batched(self):
+        batches = list(tasks._active_organization_batches())
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(
+            {org_id for batch in batches for org_id in batch},
+            {str(pk) for pk in Organization.objects.filter(is_active=True).values_list('pk', flat=True)},
+        )
+
+
+class UsageRollupTaskTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme", plan='basic')
+        for username in ("alice", "bob"):
+            User.objects.create_user(username=username, password="x", organization=self.organization)
+        self.month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def test_monthly_usage_is_dispatched_per_batch(self):
+        with mock.patch.object(tasks.calculate_usage_for_organizations, 'delay') as delay:
+            tasks.calculate_monthly_usage()
+        delay.assert_called_once_with([str(self.organization.pk)], self.month_start.isoformat())
+
+    def test_monthly_usage_upserts_one_row_per_feature(self):
+        for _ in range(2):
+            tasks.calculate_usage_for_organizations([str(self.organization.pk)], self.month_start.isoformat())
+        usage = Usage.objects.filter(organization=self.organization, period_start=self.month_start)
+        self.assertEqual(usage.filter(feature='users').count(), 1)
+        users = usage.get(feature='users')
+        self.assertEqual(users.count, 2)
+        self.assertEqual(users.limit, tasks.get_plan_limit('basic', 'users'))
+        self.assertEqual(usage.get(feature='products').count, 0)
+
+    def test_daily_report_upserts_activity_counts(self):
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        alice = User.objects.get(username="alice")
+        ActivityLog.objects.bulk_create([
+            ActivityLog(organization=self.organization, user=alice, action='create', resource_type='API')
+            for _ in range(3)
+        ])
+        ActivityLog.objects.update(created_at=yesterday)
+        for _ in range(2):
+            tasks.generate_daily_reports_for_organizations(
+                [str(self.organization.pk)], yesterday.date().isoformat()
+            )
+        report = Usage.objects.get(organization=self.organization, feature='daily_activities')
+        self.assertEqual(report.count, 3)
+        self.assertEqual(report.metadata, {'active_users': 1})
+
+
+class UploadTempDirTests(SimpleTestCase):
+    def setUp(self):
+        self.app_config = apps.get_app_config('Role_Based_auth_app')
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_ready_creates_the_upload_temp_dir(self):
+        temp_dir = os.path.join(self.root, 'media', '.upload_tmp')
+        with override_settings(FILE_UPLOAD_TEMP_DIR=temp_dir):
+            self.app_config.ensure_upload_temp_dir()
+        self.assertTrue(os.path.isdir(temp_dir))
+
+    def test_unwritable_location_only_warns(self):
+        blocker = os.path.join(self.root, 'not-a-dir')
+        open(blocker, 'w').close()
+        with override_settings(FILE_UPLOAD_TEMP_DIR=os.path.join(blocker, '.upload_tmp')):
+            with self.assertLogs('Role_Based_auth_app.apps', 'WARNING'):
+                self.app_config.ensure_upload_temp_dir()
+
+
+class APIKeyTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        self.owner = User.objects.create_user(
+            username="owner", password="x", organization=self.organization, role='owner'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_only_the_digest_is_stored_and_found_by_the_raw_key(self):
+        api_key = APIKey.objects.create(organization=self.organization, created_by=self.owner, name="CI")
+        raw_key = api_key.raw_key
+        self.assertTrue(raw_key.startswith('sk_'))
+        self.assertEqual(bytes(APIKey.objects.get(pk=api_key.pk).key_hash), APIKey.hash_key(raw_key))
+        self.assertTrue(raw_key.startswith(api_key.key_preview.rstrip('.')))
+        self.assertEqual(APIKey.objects.for_key(raw_key).get(), api_key)
+        self.assertFalse(APIKey.objects.for_key('sk_' + 'x' * 40).exists())
+        self.assertFalse(APIKey.objects.for_key('sk_clé').exists())
+        self.assertFalse(hasattr(APIKey.objects.get(pk=api_key.pk), 'raw_key'))
+
+    def test_raw_key_is_returned_only_on_creation(self):
+        # organization and created_by are required by the serializer, then set from the requester
+        response = self.client.post('/api/v1/api-keys/', {
+            'name': 'CI', 'organization': str(self.organization.pk), 'created_by': str(self.owner.pk),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        raw_key = response.data['key']
+        self.assertEqual(str(APIKey.objects.for_key(raw_key).get().pk), response.data['id'])
+        self.assertNotIn('key_hash', response.data)
+
+        detail = self.client.get(f"/api/v1/api-keys/{response.data['id']}/")
+        self.assertEqual(detail.status_code, 200)
+        self.assertNotIn('key', detail.data)
+        self.assertNotIn('key_hash', detail.data)
+
+
+class OrganizationResponseCacheTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        member = User.objects.create_user(username="alice", password="x", organization=self.organization)
+        self.client = APIClient()
+        self.client.force_authenticate(member)
+
+    def use_shared_cache(self):
+        # A file cache stands in for Redis: like it, it is shared between processes
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def names(self, url):
+        data = self.client.get(url).data
+        return [org['name'] for org in data['results']] if 'results' in data else data['name']
+
+    def assertSaveInvalidates(self, url, cached, renamed):
+        self.assertEqual(self.names(url), cached)
+        # A queryset update sends no signal, so the cached response is still served
+        Organization.objects.filter(pk=self.organization.pk).update(name="Renamed")
+        self.assertEqual(self.names(url), cached)
+        self.organization.name = "Renamed"
+        self.organization.save()
+        self.assertEqual(self.names(url), renamed)
+
+    def test_save_invalidates_the_cached_list(self):
+        self.use_shared_cache()
+        self.assertSaveInvalidates('/api/v1/organizations/', ["Acme"], ["Renamed"])
+
+    def test_save_invalidates_the_cached_detail(self):
+        self.use_shared_cache()
+        self.assertSaveInvalidates(f'/api/v1/organizations/{self.organization.pk}/', "Acme", "Renamed")
+
+    def test_process_local_cache_is_not_used_for_responses(self):
+        url = f'/api/v1/organizations/{self.organization.pk}/'
+        self.assertEqual(self.names(url), "Acme")
+        Organization.objects.filter(pk=self.organization.pk).update(name="Renamed")
+        self.assertEqual(self.names(url), "Renamed")
+
+
+class MeViewTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        self.user = User.objects.create_user(
+            username="alice", password="x", email="alice@example.com", organization=self.organization, role='admin'
+        )
+        self.client = APIClient()
+
+    def use_token(self):
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_identity_from_token_claims(self):
+        self.use_token()
+        response = self.client.get('/api/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'user_id': str(self.user.pk), 'username': "alice", 'role': 'admin', 'org': str(self.organization.pk),
+        })
+
+    def test_role_change_shows_before_the_token_expires(self):
+        self.use_token()
+        User.objects.filter(pk=self.user.pk).update(role='viewer')
+        self.assertEqual(self.client.get('/api/me/').data['role'], 'viewer')
+
+    def test_fresh_returns_the_full_profile(self):
+        self.use_token()
+        response = self.client.get('/api/me/', {'fresh': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], "alice@example.com")
+
+    def test_authentication_without_token_claims_returns_the_full_profile(self):
+        # Session and basic authentication leave request.auth as None
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], "alice@example.com")
+
+
+class FakeRedis:
+    """In-memory stand-in for the hash and key commands view_counts sends; pipelines run immediately"""
+
+    def __init__(self):
+        self.data = {}
+
+    def hincrby(self, key, field, amount=1):
+        fields = self.data.setdefault(key, {})
+        field = field.encode()
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+
+    def hgetall(self, key):
+        return {field: str(count).encode() for field, count in self.data.get(key, {}).items()}
+
+    def rename(self, src, dst):
+        if src not in self.data:
+            raise redis.ResponseError("ERR no such key")
+        self.data[dst] = self.data.pop(src)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+class ProductViewCountTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Acme", slug="acme")
+        self.products = [
+            Product.objects.create(organization=organization, product_name=name, description="", price=1, quantity=1)
+            for name in ("Widget", "Gadget")
+        ]
+        self.redis = FakeRedis()
+        for patcher in (
+            mock.patch.object(view_counts, 'get_redis_client', return_value=self.redis),
+            mock.patch.object(view_counts, '_redis_unavailable_until', 0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def view_counts(self):
+        return [Product.objects.get(pk=product.pk).view_count for product in self.products]
+
+    def record(self, views):
+        for product, count in zip(self.products, views):
+            for _ in range(count):
+                view_counts.record_product_view(product.pk)
+
+    def test_flush_adds_the_buffered_views(self):
+        self.record([3, 1])
+        self.assertEqual(self.view_counts(), [0, 0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(view_counts.flush_product_views(), 2)
+        self.assertEqual(self.view_counts(), [3, 1])
+        self.assertEqual(self.redis.data, {})
+
+    def test_flush_with_nothing_buffered(self):
+        self.assertEqual(view_counts.flush_product_views(), 0)
+
+    def test_failed_flush_puts_the_views_back(self):
+        self.record([3, 1])
+        with mock.patch.object(view_counts, '_add_views', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                view_counts.flush_product_views()
+        self.assertEqual(list(self.redis.data), [view_counts.PRODUCT_VIEWS_KEY])
+        with self.captureOnCommitCallbacks(execute=True):
+            view_counts.flush_product_views()
+        self.assertEqual(self.view_counts(), [3, 1])
+
+    def test_redis_outage_falls_back_to_the_database_without_retrying(self):
+        with mock.patch.object(self.redis, 'hincrby', side_effect=redis.ConnectionError) as hincrby:
+            with self.assertLogs('Role_Based_auth_app.view_counts', 'WARNING'):
+                self.record([2, 1])
+        self.assertEqual(hincrby.call_count, 1)
+        self.assertEqual(self.view_counts(), [2, 1])
+
+
+class OrganizationNameSyncTests(TestCase):
+    def setUp(self):
+        self.acme = Organization.objects.create(name="Acme", slug="acme")
+        self.globex = Organization.objects.create(name="Globex", slug="globex")
+        Category.objects.create(organization=self.acme, name="Tools", slug="tools")
+
+    def test_name_is_copied_on_create(self):
+        self.assertEqual(Category.objects.get().organization_name, "Acme")
+
+    def test_reassigned_organization_id_refetches_the_name(self):
+        category = Category.objects.get()
+        category.organization_id = self.globex.pk
+        category.save()
+        self.assertEqual(Category.objects.get().organization_name, "Globex")
+
+    def test_unchanged_organization_is_not_refetched(self):
+        category = Category.objects.get()
+        category.name = "Hardware"
+        with self.assertNumQueries(1):
+            category.save(update_fields=['name', 'organization_name'])
+
+
+class OrganizationScopingTests(TestCase):
+    def setUp(self):
+        self.acme = Organization.objects.create(name="Acme", slug="acme")
+        self.globex = Organization.objects.create(name="Globex", slug="globex")
+        self.alice = User.objects.create_user(username="alice", password="x", organization=self.acme, role='admin')
+        self.bob = User.objects.create_user(username="bob", password="x", organization=self.globex, role='admin')
+        for organization in (self.acme, self.globex):
+            Product.objects.create(
+                organization=organization, product_name=organization.name, description="", price=1, quantity=1
+            )
+        self.client = APIClient()
+
+    def visible(self, user, url):
+        self.client.force_authenticate(user)
+        return sorted(row['username' if 'users' in url else 'product_name'] for row in self.client.get(url).data['results'])
+
+    def test_members_see_their_organization(self):
+        self.assertEqual(self.visible(self.alice, '/api/v1/users/'), ["alice"])
+        self.assertEqual(self.visible(self.alice, '/api/v1/products/'), ["Acme"])
+
+    def test_members_cannot_fetch_other_organizations_rows(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get(f'/api/v1/users/{self.bob.pk}/').status_code, 404)
+
+    def test_staff_see_every_organization_on_every_endpoint(self):
+        staff = User.objects.create_user(
+            username="staff", password="x", organization=self.acme, role='admin', is_staff=True
+        )
+        self.assertEqual(self.visible(staff, '/api/v1/users/'), ["alice", "bob", "staff"])
+        self.assertEqual(self.visible(staff, '/api/v1/products/'), ["Acme", "Globex"])
+
+    def test_users_without_an_organization_see_nothing(self):
+        loner = User.objects.create_user(username="loner", password="x", role='admin')
+        self.assertEqual(self.visible(loner, '/api/v1/users/'), [])
+        self.assertEqual(self.visible(loner, '/api/v1/products/'), [])
+
+
+class MarkNotificationReadTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        self.user = User.objects.create_user(username="alice", password="x", organization=self.organization)
+        self.notification = Notification.objects.create(
+            user=self.user, organization=self.organization, title="Hello", message="World"
+        )
+        self.url = f'/api/v1/notifications/{self.notification.pk}/mark_read/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_marks_read_with_a_single_update(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.notification.refresh_from_db()
+        self.assertTrue(self.notification.is_read)
+        self.assertEqual(response.data['read_at'], self.notification.read_at)
+
+    def test_second_call_keeps_the_first_read_at(self):
+        first = self.client.post(self.url).data['read_at']
+        self.assertEqual(self.client.post(self.url).data['read_at'], first)
+
+    def test_full_returns_the_notification(self):
+        response = self.client.post(self.url + '?full=1')
+        self.assertEqual(response.data['title'], "Hello")
+        self.assertTrue(response.data['is_read'])
+
+    def test_other_users_notifications_are_not_found(self):
+        other = User.objects.create_user(username="bob", password="x", organization=self.organization)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.post(self.url).status_code, 404)
+        self.notification.refresh_from_db()
+        self.assertFalse(self.notification.is_read)
+
+
+# The manifest storage needs collectstatic before admin pages render
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ListOnlyFieldsAdminTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Acme", slug="acme")
+        user = User.objects.create_user(username="alice", password="x", organization=organization)
+        self.notifications = Notification.objects.bulk_create([
+            Notification(user=user, organization=organization, title=f"Note {i}", message="x") for i in range(3)
+        ])
+        self.client.force_login(User.objects.create_superuser(username="root", password="x"))
+        self.url = '/admin/Role_Based_auth_app/notification/'
+
+    def test_changelist_page_loads_only_the_listed_columns(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        for notification in response.context['cl'].result_list:
+            self.assertIn('message', notification.get_deferred_fields())
+
+    def test_actions_get_the_full_queryset(self):
+        model_admin = admin.site._registry[Notification]
+        with mock.patch.object(type(model_admin), 'delete_queryset') as delete_queryset:
+            self.client.post(self.url, {
+                'action': 'delete_selected', 'post': 'yes',
+                admin.helpers.ACTION_CHECKBOX_NAME: [str(n.pk) for n in self.notifications],
+            })
+        queryset = delete_queryset.call_args.args[1]
+        self.assertEqual(queryset.count(), 3)
+        self.assertFalse(any(notification.get_deferred_fields() for notification in queryset))
+
+
+class RolePermissionTests(TestCase):
+    ROLES = ('owner', 'admin', 'manager', 'user', 'viewer')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.acme = Organization.objects.create(name="Acme", slug="acme")
+        cls.globex = Organization.objects.create(name="Globex", slug="globex")
+        cls.users = {
+            role: User.objects.create_user(username=role, password="x", organization=cls.acme, role=role)
+            for role in cls.ROLES
+        }
+        cls.staff = User.objects.create_user(
+            username="staff", password="x", organization=cls.globex, role='viewer', is_staff=True
+        )
+
+    def request(self, user, method='GET'):
+        request = Request(APIRequestFactory().generic(method, '/'))
+        request.user = user
+        return request
+
+    def allowed_roles(self, permission, method):
+        return {
+            role for role, user in self.users.items()
+            if permission().has_permission(self.request(user, method), None)
+        }
+
+    def assertStaffOnly(self, permission, method, allowed=True):
+        self.assertIs(permission().has_permission(self.request(self.staff, method), None), allowed)
+        self.assertFalse(permission().has_permission(self.request(AnonymousUser(), method), None))
+
+    def test_can_manage_products(self):
+        self.assertEqual(self.allowed_roles(CanManageProducts, 'GET'), set(self.ROLES))
+        self.assertEqual(self.allowed_roles(CanManageProducts, 'POST'), {'owner', 'admin', 'manager'})
+        self.assertStaffOnly(CanManageProducts, 'POST')
+
+    def test_can_delete_products(self):
+        self.assertEqual(self.allowed_roles(CanDeleteProducts, 'POST'), set(self.ROLES))
+        self.assertEqual(self.allowed_roles(CanDeleteProducts, 'DELETE'), {'owner', 'admin'})
+        self.assertStaffOnly(CanDeleteProducts, 'DELETE')
+
+    def test_is_admin_or_owner(self):
+        for method in ('GET', 'POST'):
+            self.assertEqual(self.allowed_roles(IsAdminOrOwner, method), {'owner', 'admin'})
+        self.assertStaffOnly(IsAdminOrOwner, 'GET')
+
+    def test_role_is_read_from_the_user_not_a_token_claim(self):
+        viewer = self.users['viewer']
+        viewer.role = 'owner'
+        self.assertTrue(IsAdminOrOwner().has_permission(self.request(viewer), None))
+
+    def test_is_same_organization(self):
+        product = Product.objects.create(organization=self.acme, product_name="Widget", description="", price=1, quantity=1)
+        permission = IsSameOrganization()
+        for role, user in self.users.items():
+            self.assertTrue(permission.has_object_permission(self.request(user), None, product), role)
+            self.assertTrue(permission.has_object_permission(self.request(user), None, self.users['owner']), role)
+        self.assertFalse(permission.has_object_permission(self.request(self.staff), None, product))
+        self.assertFalse(permission.has_object_permission(self.request(AnonymousUser()), None, product))
+
+    def test_is_api_key_owner(self):
+        api_key = APIKey.objects.create(organization=self.acme, created_by=self.users['owner'], name="CI")
+        allowed = {
+            role for role, user in self.users.items()
+            if IsAPIKeyOwner().has_object_permission(self.request(user), None, api_key)
+        }
+        self.assertEqual(allowed, {'owner', 'admin'})
+        other_admin = User.objects.create_user(username="other", password="x", organization=self.globex, role='admin')
+        self.assertFalse(IsAPIKeyOwner().has_object_permission(self.request(other_admin), None, api_key))
+        self.assertFalse(IsAPIKeyOwner().has_object_permission(self.request(AnonymousUser()), None, api_key))
+
+    def test_checks_are_memoized_per_request_and_permission(self):
+        request = self.request(self.users['manager'], 'DELETE')
+        self.assertTrue(CanManageProducts().has_permission(request, None))
+        # CanDeleteProducts shares the inherited method but must not reuse the result above
+        self.assertFalse(CanDeleteProducts().has_permission(request, None))
+
+
+class ListPaginationTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+        self.owner = User.objects.create_user(username="owner", password="x", organization=self.organization, role='owner')
+        now = timezone.now()
+        for i, (name, price) in enumerate([("Widget", 5), ("Gadget", 3), ("Widget Pro", 9), ("Gizmo", 1), ("Doohickey", 7)]):
+            product = Product.objects.create(
+                organization=self.organization, product_name=name, description="", price=price, quantity=1
+            )
+            Product.objects.filter(pk=product.pk).update(created_at=now - timezone.timedelta(minutes=i))
+            log = ActivityLog.objects.create(
+                organization=self.organization, action='create', resource_type='Product', description=name
+            )
+            ActivityLog.objects.filter(pk=log.pk).update(created_at=now - timezone.timedelta(minutes=i))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def walk_cursor(self, url, key):
+        seen = []
+        response = self.client.get(url, {'cursor': '', 'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(row[key] for row in response.data['results'])
+            if not response.data['next']:
+                return seen
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_products_newest_first(self):
+        self.assertEqual(
+            self.walk_cursor('/api/v1/products/', 'product_name'),
+            ["Widget", "Gadget", "Widget Pro", "Gizmo", "Doohickey"],
+        )
+
+    def test_cursor_pages_activity_logs_newest_first(self):
+        self.assertEqual(
+            self.walk_cursor('/api/v1/activity-logs/', 'description'),
+            ["Widget", "Gadget", "Widget Pro", "Gizmo", "Doohickey"],
+        )
+
+    def test_page_numbers_without_cursor(self):
+        response = self.client.get('/api/v1/products/', {'page': 2, 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([row['product_name'] for row in response.data['results']], ["Widget Pro", "Gizmo"])
+
+    def test_search_applies_with_page_params(self):
+        response = self.client.get('/api/v1/products/', {'search': 'Widget', 'page': 1, 'page_size': 10})
+        self.assertEqual([row['product_name'] for row in response.data['results']], ["Widget", "Widget Pro"])
+        response = self.client.get('/api/v1/products/', {'search': 'Widget', 'cursor': '', 'page_size': 10})
+        self.assertEqual([row['product_name'] for row in response.data['results']], ["Widget", "Widget Pro"])
+
+    def test_ordering_applies_with_page_params(self):
+        response = self.client.get('/api/v1/products/', {'ordering': 'price', 'page': 1, 'page_size': 3})
+        self.assertEqual([row['product_name'] for row in response.data['results']], ["Gizmo", "Gadget", "Widget"])
+
+
+class AnnotatedFieldTests(TestCase):
+    """The <field>_db annotations must render exactly like the model properties they replace"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Acme", slug="acme")
+
+    def assertAnnotationMatchesProperty(self, serializer_class, annotated, fields):
+        for instance in annotated:
+            plain = type(instance).objects.get(pk=instance.pk)
+            self.assertFalse(any(f'{field}_db' in plain.__dict__ for field in fields))
+            with_annotation = serializer_class(instance).data
+            from_property = serializer_class(plain).data
+            for field in fields:
+                self.assertEqual(with_annotation[field], from_property[field], (field, instance.pk))
+
+    def test_product_fields(self):
+        for sale_price, quantity in ((None, 0), (0, 3), (4, 1)):
+            Product.objects.create(
+                organization=self.organization, product_name="Widget", description="",
+                price=5, sale_price=sale_price, quantity=quantity,
+            )
+        fields = ('effective_price', 'is_in_stock')
+        self.assertAnnotationMatchesProperty(ProductSerializer, Product.objects.with_derived(), fields)
+        self.assertAnnotationMatchesProperty(ProductListSerializer, Product.objects.with_derived(), fields)
+
+    def test_subscription_is_active(self):
+        now = timezone.now()
+        for organization, status, days in (
+            (self.organization, 'active', 1),
+            (Organization.objects.create(name="Globex", slug="globex"), 'active', -1),
+            (Organization.objects.create(name="Initech", slug="initech"), 'canceled', 1),
+        ):
+            # Every organization gets a subscription when it is created
+            Subscription.objects.filter(organization=organization).update(
+                status=status, current_period_end=now + timezone.timedelta(days=days)
+            )
+        self.assertAnnotationMatchesProperty(
+            SubscriptionSerializer, Subscription.objects.with_derived(), ('is_active',)
+        )
+        self.assertEqual(
+            sorted(SubscriptionSerializer(s).data['is_active'] for s in Subscription.objects.with_derived()),
+            [False, False, True],
+        )
+
+    def test_usage_fields(self):
+        now = timezone.now()
+        for feature, count, limit in (('users', 3, 4), ('products', 5, 5), ('storage', 9, 0), ('api', 2, None)):
+            Usage.objects.create(
+                organization=self.organization, feature=feature, count=count, limit=limit,
+                period_start=now, period_end=now,
+            )
+        self.assertAnnotationMatchesProperty(
+            UsageSerializer, Usage.objects.with_derived(), ('usage_percentage', 'is_limit_exceeded')
+        )
+
+    def test_create_and_update_responses_use_the_properties(self):
+        owner = User.objects.create_user(username="owner", password="x", organization=self.organization, role='owner')
+        client = APIClient()
+        client.force_authenticate(owner)
+        response = client.post('/api/v1/products/', {
+            'product_name': "Widget", 'description': "A widget", 'price': '5.00', 'sale_price': '4.00', 'quantity': 0,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['effective_price'], response.data['is_in_stock']), ('4.00', False))
+        response = client.patch(f"/api/v1/products/{response.data['id']}/", {'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(response.data['is_in_stock'])
@@ -0,0 +1,92 @@
+import logging
+import time
+import uuid
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_VIEWS_KEY = 'product:views'
+VIEW_FLUSH_BATCH_SIZE = 500
+REDIS_RETRY_INTERVAL = 30.0  # seconds
+
+_client = None
+# After a Redis error, views are written straight to the database until then (time.monotonic())
+_redis_unavailable_until = 0.0
+
+
+def get_redis_client():
+    """Process-wide client for REDIS_URL; short timeouts keep a Redis outage off the request path"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5
+        )
+    return _client
+
+
+def record_product_view(product_id):
+    """
+    Buffer one view of a product in Redis; falls back to a direct UPDATE when
+    Redis is unavailable. After an error Redis is left alone for
+    REDIS_RETRY_INTERVAL, so requests don't each wait out the socket timeout.
+    """
+    global _redis_unavailable_until
+    product_id = str(uuid.UUID(str(product_id)))
+    if time.monotonic() >= _redis_unavailable_until:
+        try:
+            get_redis_client().hincrby(PRODUCT_VIEWS_KEY, product_id, 1)
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Redis unavailable, writing product views directly for {REDIS_RETRY_INTERVAL}s: {e}")
+            _redis_unavailable_until = time.monotonic() + REDIS_RETRY_INTERVAL
+    Product.objects.filter(pk=product_id).update(view_count=F('view_count') + 1)
+
+
+def _add_views(views):
+    """Add (product_id, count) pairs to Product.view_count; returns the number of products updated"""
+    updated = 0
+    for i in range(0, len(views), VIEW_FLUSH_BATCH_SIZE):
+        batch = views[i:i + VIEW_FLUSH_BATCH_SIZE]
+        # One UPDATE per batch, adding each product's own count
+        updated += Product.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            view_count=F('view_count') + Case(
+                *(When(pk=pk, then=Value(count)) for pk, count in batch),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+    return updated
+
+
+def flush_product_views():
+    """Move the buffered view counts into Product.view_count; returns the number of products updated"""
+    client = get_redis_client()
+    # RENAME takes the buffer atomically; views recorded meanwhile start a new hash
+    flush_key = f'{PRODUCT_VIEWS_KEY}:flush:{uuid.uuid4().hex}'
+    try:
+        client.rename(PRODUCT_VIEWS_KEY, flush_key)
+    except redis.ResponseError as e:
+        if 'no such key' not in str(e).lower():
+            raise
+        return 0
+    views = [(key.decode(), int(count)) for key, count in client.hgetall(flush_key).items()]
+    try:
+        with transaction.atomic():
+            updated = _add_views(views)
+            # The renamed hash is only dropped once the counts are committed
+            transaction.on_commit(lambda: client.delete(flush_key))
+    except Exception:
+        # Hand the counts back to the live buffer for the next flush
+        pipe = client.pipeline(transaction=True)
+        for product_id, count in views:
+            pipe.hincrby(PRODUCT_VIEWS_KEY, product_id, count)
+        pipe.delete(flush_key)
+        pipe.execute()
+        raise
+    return updated
@@ -1,103 +1,244 @@
-from rest_framework import viewsets, permissions, mixins, status, generics
+from rest_framework import viewsets, permissions, mixins, status, generics, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.tokens import Token
 from rest_framework_simplejwt.views import TokenObtainPairView
-from django.db.models import F
+from rest_framework.exceptions import NotFound
+from functools import lru_cache
+import uuid
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
 
 from .models import (Product, ProductImage, Subscription, Usage, FileUpload, 
                      APIKey, Notification, ActivityLog, Organization, User, Category)
 from .serializers import (ProductSerializer, ProductImageSerializer, SubscriptionSerializer, 
                          UsageSerializer, FileUploadSerializer, APIKeySerializer, 
                          NotificationSerializer, ActivityLogSerializer, OrganizationSerializer, 
-                         UserSerializer, CategorySerializer, MyTokenObtainPairSerializer)
+                         UserSerializer, CategorySerializer, MyTokenObtainPairSerializer,
+                         ProductListSerializer, ActivityLogListSerializer)
 from .filters import ProductFilter, FileUploadFilter, NotificationFilter
-from .permissions import (IsOwner, IsAdminOrOwner, IsManagerOrAbove, IsSameOrganization,
+from .pagination import CursorResultsSetPagination
+from .view_counts import record_product_view
+from .caching import ORGANIZATION_CACHE_TIMEOUT, organization_cache_key, response_cache_enabled
+from .permissions import (IsOwner, IsAdminOrOwner, IsManagerOrAbove,
                          CanCreateUsers, CanManageProducts, CanDeleteProducts)
 
 User = get_user_model()
 
 
-class BaseOrgViewSet(viewsets.ModelViewSet):
+def get_eager_lookups(serializer, prefix=''):
     """
-    Base ViewSet that filters by organization and applies organization-level permissions
+    Walk a serializer's fields and return the (select_related, prefetch_related)
+    lookups needed to render it without per-row queries. Plain primary key
+    relations are skipped as they are read from the local ``*_id`` column.
     """
-    permission_classes = [IsAuthenticated, IsSameOrganization]
-    
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*' or '.' in field.source:
+            continue
+        lookup = prefix + field.source
+        if isinstance(field, serializers.ManyRelatedField):
+            prefetch.append(lookup)
+        elif isinstance(field, serializers.ListSerializer):
+            prefetch.append(lookup)
+            child_select, child_prefetch = get_eager_lookups(field.child, lookup + '__')
+            prefetch.extend(child_select + child_prefetch)
+        elif isinstance(field, serializers.Serializer):
+            select.append(lookup)
+            child_select, child_prefetch = get_eager_lookups(field, lookup + '__')
+            select.extend(child_select)
+            prefetch.extend(child_prefetch)
+    return select, prefetch
+
+
+@lru_cache(maxsize=None)
+def model_field_names(model):
+    """Names of a model's fields, including relations"""
+    return frozenset(field.name for field in model._meta.get_fields())
+
+
+class AutoPrefetchViewSetMixin:
+    """
+    Eager-load the relations rendered by the viewset's serializer so list
+    endpoints run a fixed number of queries regardless of page size.
+    Viewsets that build their queryset without calling super().get_queryset()
+    should pass it through auto_prefetch() themselves.
+    """
+    _eager_lookups = {}
+
+    def get_queryset(self):
+        return self.auto_prefetch(super().get_queryset())
+
+    def auto_prefetch(self, queryset):
+        serializer_class = self.get_serializer_class()
+        # Serializers can declare their own eager loading
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            return serializer_class.setup_eager_loading(queryset)
+        if serializer_class not in self._eager_lookups:
+            self._eager_lookups[serializer_class] = get_eager_lookups(serializer_class())
+        select, prefetch = self._eager_lookups[serializer_class]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class BaseModelViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    """
+    ModelViewSet with eager loading. The list action can use a slimmer
+    list_serializer_class and load only list_only_fields, which must name
+    every column that serializer reads. Setting cursor_pagination_class lets
+    clients opt into keyset pagination by passing ?cursor= (empty for the
+    first page).
+    """
+    list_serializer_class = None
+    list_only_fields = ()
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (self.cursor_pagination_class is not None and self.request is not None
+                    and 'cursor' in self.request.query_params):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.list_serializer_class is not None:
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        # The filter, search and ordering backends are all no-ops without
+        # query parameters, so skip building them for plain (paged) requests
+        paginator = self.paginator
+        pagination_params = {
+            getattr(paginator, 'page_query_param', None),
+            getattr(paginator, 'cursor_query_param', None),
+            getattr(paginator, 'page_size_query_param', None),
+        }
+        if self.request.query_params.keys() <= pagination_params:
+            return queryset
+        return super().filter_queryset(queryset)
+
     def get_queryset(self):
-        """Filter queryset by user's organization"""
         queryset = super().get_queryset()
-        if hasattr(self.request.user, 'organization') and self.request.user.organization:
-            if hasattr(queryset.model, 'organization'):
-                return queryset.filter(organization=self.request.user.organization)
+        if self.action == 'list' and self.list_only_fields:
+            # Deferred foreign keys cannot be followed with select_related
+            queryset = queryset.select_related(None).only(*self.list_only_fields)
         return queryset
+
+
+class OrganizationScopedQuerysetMixin:
+    """
+    Limit get_queryset() to the requesting user's organization, so other
+    tenants' rows are excluded by the query and single-object lookups outside
+    the organization return 404. Staff see every organization's rows, even
+    with an organization of their own; other users without one see nothing.
+    """
+    organization_field = 'organization'
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        organization_id = getattr(user, 'organization_id', None)
+        if organization_id is None:
+            return queryset.none()
+        # Filter on the local *_id column so no join or Organization fetch is needed
+        return queryset.filter(**{f'{self.organization_field}_id': organization_id})
+
+
+class BaseOrgViewSet(OrganizationScopedQuerysetMixin, BaseModelViewSet):
+    """
+    Base ViewSet whose queryset is scoped to the user's organization
+    """
+    permission_classes = [IsAuthenticated]
     
     def perform_create(self, serializer):
-        """Auto-assign organization and user when creating objects"""
-        if hasattr(self.request.user, 'organization') and self.request.user.organization:
-            if 'organization' in serializer.validated_data or hasattr(serializer.Meta.model, 'organization'):
-                serializer.save(organization=self.request.user.organization)
-        
-        if hasattr(serializer.Meta.model, 'created_by'):
-            serializer.save(created_by=self.request.user)
+        """Auto-assign organization and user when creating objects, in a single save"""
+        field_names = model_field_names(serializer.Meta.model)
+        save_kwargs = {}
+        if self.request.user.organization_id and 'organization' in field_names:
+            save_kwargs['organization'] = self.request.user.organization
+        if 'created_by' in field_names:
+            save_kwargs['created_by'] = self.request.user
+        serializer.save(**save_kwargs)
 
 
 class ProductViewSet(BaseOrgViewSet):
-    queryset = Product.objects.select_related('organization', 'category').prefetch_related('images').all()
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    list_serializer_class = ProductListSerializer
+    list_only_fields = (
+        'id', 'product_name', 'name', 'slug', 'price', 'sale_price', 'quantity', 'sku',
+        'is_active', 'rating', 'review_count', 'created_at'
+    )
     filterset_class = ProductFilter
     search_fields = ['product_name', 'name', 'description']
-    permission_classes = [IsAuthenticated, CanManageProducts, IsSameOrganization]
+    permission_classes = [IsAuthenticated, CanManageProducts]
+    cursor_pagination_class = CursorResultsSetPagination
 
     @action(detail=True, methods=['post'])
     def increment_view(self, request, pk=None):
-        Product.objects.filter(pk=pk).update(view_count=F('view_count') + 1)
+        # Buffered in Redis and written by the flush_product_views task
+        try:
+            record_product_view(pk)
+        except ValueError:
+            raise NotFound()
         return Response({"ok": True})
 
 
 class ProductImageViewSet(BaseOrgViewSet):
-    queryset = ProductImage.objects.select_related('product', 'product__organization').all()
+    queryset = ProductImage.objects.all()
     serializer_class = ProductImageSerializer
+    organization_field = 'product__organization'
     parser_classes = [MultiPartParser, FormParser]
 
 
 class SubscriptionViewSet(BaseOrgViewSet):
-    queryset = Subscription.objects.select_related('organization').all()
+    queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
     permission_classes = [IsAuthenticated, IsAdminOrOwner]
 
 
 class UsageViewSet(BaseOrgViewSet):
-    queryset = Usage.objects.select_related('organization').all()
+    queryset = Usage.objects.all()
     serializer_class = UsageSerializer
     permission_classes = [IsAuthenticated, IsAdminOrOwner]
 
 
 class FileUploadViewSet(BaseOrgViewSet):
-    queryset = FileUpload.objects.select_related('organization', 'uploaded_by').all()
+    queryset = FileUpload.objects.all()
     serializer_class = FileUploadSerializer
     parser_classes = [MultiPartParser, FormParser]
     filterset_class = FileUploadFilter
 
     def perform_create(self, serializer):
         serializer.save(
-            organization=getattr(self.request.user, 'organization', None),
+            organization=self.request.user.organization,
             uploaded_by=self.request.user
         )
 
 
 class APIKeyViewSet(BaseOrgViewSet):
-    queryset = APIKey.objects.select_related('organization', 'created_by').all()
+    queryset = APIKey.objects.all()
     serializer_class = APIKeySerializer
     permission_classes = [IsAuthenticated, IsAdminOrOwner]
 
 
 class NotificationViewSet(BaseOrgViewSet):
-    queryset = Notification.objects.select_related('organization', 'user').all()
+    queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     filterset_class = NotificationFilter
 
@@ -107,19 +248,43 @@ class NotificationViewSet(BaseOrgViewSet):
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
-        obj = self.get_object()
-        obj.mark_as_read()
-        return Response(NotificationSerializer(obj).data)
+        """
+        Mark the notification read with one scoped, conditional UPDATE and
+        return its read state; pass ?full=1 for the whole notification.
+        """
+        try:
+            pk = uuid.UUID(str(pk))
+        except ValueError:
+            raise NotFound()
+        notifications = self.get_queryset().filter(pk=pk)
+        read_at = timezone.now()
+        # An already read notification keeps the read_at of the first call
+        if not notifications.filter(is_read=False).update(is_read=True, read_at=read_at):
+            row = notifications.values('read_at').first()
+            if row is None:
+                raise NotFound()
+            read_at = row['read_at']
+        if request.query_params.get('full'):
+            return Response(NotificationSerializer(notifications.get()).data)
+        return Response({'id': pk, 'is_read': True, 'read_at': read_at})
 
 
 class ActivityLogViewSet(BaseOrgViewSet):
-    queryset = ActivityLog.objects.select_related('organization', 'user').all()
+    queryset = ActivityLog.objects.all()
     serializer_class = ActivityLogSerializer
+    list_serializer_class = ActivityLogListSerializer
+    list_only_fields = (
+        'id', 'organization', 'user', 'action', 'resource_type', 'resource_id',
+        'description', 'ip_address', 'request_path', 'request_method', 'created_at'
+    )
     http_method_names = ['get', 'head', 'options', 'delete']  # read-only + delete
     permission_classes = [IsAuthenticated, IsAdminOrOwner]
+    # The log only grows; deep pages by offset get slower, the cursor does not.
+    # Served by the (organization, created_at) index
+    cursor_pagination_class = CursorResultsSetPagination
 
 
-class OrganizationViewSet(viewsets.ModelViewSet):
+class OrganizationViewSet(BaseModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
     permission_classes = [IsAuthenticated]
@@ -128,27 +293,43 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         """Users can only see their own organization"""
         if self.request.user.is_staff:
             return Organization.objects.all()
-        if hasattr(self.request.user, 'organization') and self.request.user.organization:
-            return Organization.objects.filter(id=self.request.user.organization.id)
+        if self.request.user.organization_id:
+            return Organization.objects.filter(id=self.request.user.organization_id)
         return Organization.objects.none()
+    
+    def cached_response(self, handler, request, *args, **kwargs):
+        """
+        Serve a member's reads of their organization from the cache; every
+        member shares the entry, which is dropped when the organization is saved.
+        Skipped unless the cache is shared by all workers (see response_cache_enabled).
+        """
+        organization_id = request.user.organization_id
+        if request.user.is_staff or not organization_id or not response_cache_enabled():
+            return handler(request, *args, **kwargs)
+        key = organization_cache_key(organization_id, request.build_absolute_uri())
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, ORGANIZATION_CACHE_TIMEOUT)
+        return response
+    
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
 
 
 class UserViewSet(BaseOrgViewSet):
-    queryset = User.objects.select_related('organization').all()
+    queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, CanCreateUsers]
-    
-    def get_queryset(self):
-        """Filter users by organization"""
-        if self.request.user.is_staff:
-            return User.objects.all()
-        if hasattr(self.request.user, 'organization') and self.request.user.organization:
-            return User.objects.filter(organization=self.request.user.organization)
-        return User.objects.none()
 
 
 class CategoryViewSet(BaseOrgViewSet):
-    queryset = Category.objects.select_related('organization').all()
+    queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated, IsManagerOrAbove]
 
@@ -160,11 +341,28 @@ class MyTokenObtainPairView(TokenObtainPairView):
 
 # User Management Views
 class MeView(APIView):
+    """
+    The current user's identity without serializing the full profile. Only the
+    user_id and org claims are read from the access token; username and role
+    come from the authenticated user, as token claims go stale after a rename
+    or a role change. Pass ?fresh=1, or authenticate without a JWT, for the
+    full profile serialized from the database.
+    """
     permission_classes = [IsAuthenticated]
+    token_claims = ('user_id', 'org')
 
     def get(self, request):
         user = request.user
-        return Response(UserSerializer(user).data)
+        token = request.auth
+        if (request.query_params.get('fresh') or not isinstance(token, Token)
+                or not all(claim in token for claim in self.token_claims)):
+            return Response(UserSerializer(user).data)
+        return Response({
+            'user_id': token['user_id'],
+            'username': user.username,
+            'role': user.role,
+            'org': token['org'],
+        })
 
 
 class ChangePasswordView(APIView):
@@ -181,8 +379,9 @@ class ChangePasswordView(APIView):
         if not old_password:
             return Response({'detail': 'Old password required.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Verify old password
-        if not user.check_password(old_password):
+        # Verify old password; the hashers function skips User.check_password's
+        # upgrade-on-login rehash and save, since the hash is replaced below anyway
+        if not check_password(old_password, user.password):
             return Response({'detail': 'Invalid old password.'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
@@ -191,7 +390,7 @@ class ChangePasswordView(APIView):
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=['password'])
         return Response({'detail': 'Password changed successfully.'})
 
 
@@ -204,7 +403,7 @@ class ToggleTwoFactorView(APIView):
         enable = request.data.get('enable', False)
         
         user.two_factor_enabled = enable
-        user.save()
+        user.save(update_fields=['two_factor_enabled'])
         
         if enable:
             return Response({'detail': '2FA enabled.', 'two_factor_enabled': True}, status=status.HTTP_200_OK)
@@ -212,20 +411,6 @@ class ToggleTwoFactorView(APIView):
             return Response({'detail': '2FA disabled.', 'two_factor_enabled': False}, status=status.HTTP_200_OK)
 
 
-# Product Management Views (for backward compatibility with existing URLs)
-class ProductListView(generics.ListAPIView):
-    serializer_class = ProductSerializer
-    permission_classes = [IsAuthenticated]
-    filterset_class = ProductFilter
-    search_fields = ['product_name', 'name', 'description']
-    
-    def get_queryset(self):
-        queryset = Product.objects.select_related('organization', 'category').prefetch_related('images')
-        if hasattr(self.request.user, 'organization') and self.request.user.organization:
-            return queryset.filter(organization=self.request.user.organization)
-        return queryset.none()
-
-
 class AdminOnlyUserCreateView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -233,12 +418,12 @@ class AdminOnlyUserCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         # Auto-assign organization from the requesting user
-        if hasattr(self.request.user, 'organization') and self.request.user.organization:
+        if self.request.user.organization_id:
             serializer.save(organization=self.request.user.organization)
 
 
 class AdminProductView(APIView):
-    permission_classes = [IsAuthenticated, CanManageProducts]
+    permission_classes = [IsAuthenticated, CanManageProducts, CanDeleteProducts]
     
     def post(self, request):
         """Create a new product"""
@@ -246,28 +431,18 @@ class AdminProductView(APIView):
         if serializer.is_valid():
             # Auto-assign organization and creator
             serializer.save(
-                organization=getattr(request.user, 'organization', None),
+                organization=request.user.organization,
                 created_by=request.user
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def delete(self, request, product_id):
-        """Delete a product"""
-        try:
-            product = Product.objects.get(
-                id=product_id,
-                organization=getattr(request.user, 'organization', None)
-            )
-            
-            # Check if user has delete permissions
-            if not request.user.role in ['admin', 'owner']:
-                return Response(
-                    {'detail': 'You do not have permission to delete products.'}, 
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            product.delete()
-            return Response({'detail': 'Product deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)
-        except Product.DoesNotExist:
+        """Delete a product; CanDeleteProducts limits this to admins and owners"""
+        deleted, _ = Product.objects.filter(
+            id=product_id,
+            organization_id=request.user.organization_id
+        ).delete()
+        if not deleted:
             return Response({'detail': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'detail': 'Product deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)